@@ -0,0 +1,142 @@
+import os
+import asyncio
+from collections import Counter
+from pathlib import Path
+from urllib.parse import quote
+from typing import List, Tuple
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+BM25_INDEX_DIR = Path(os.getenv("BM25_INDEX_DIR", CACHE_DIR / "bm25"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_indexes = {}
+
+
+class BM25Index:
+    """Okapi BM25 over one document's chunks, stored as sorted-term postings arrays."""
+
+    def __init__(self, terms, chunk_ids, doc_lengths, offsets, postings_rows, postings_tf):
+        self.terms = terms
+        self.chunk_ids = chunk_ids
+        self.doc_lengths = doc_lengths
+        self.offsets = offsets
+        self.postings_rows = postings_rows
+        self.postings_tf = postings_tf
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(chunk_ids.tolist())}
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=self.terms,
+            chunk_ids=self.chunk_ids,
+            doc_lengths=self.doc_lengths,
+            offsets=self.offsets,
+            postings_rows=self.postings_rows,
+            postings_tf=self.postings_tf,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path) as data:
+            return cls(
+                data["terms"],
+                data["chunk_ids"],
+                data["doc_lengths"],
+                data["offsets"],
+                data["postings_rows"],
+                data["postings_tf"],
+            )
+
+    def scores(self, query_tokens: List[str]) -> np.ndarray:
+        n_chunks = len(self.chunk_ids)
+        scores = np.zeros(n_chunks, dtype=np.float32)
+        if not n_chunks or not len(self.terms):
+            return scores
+
+        for term in (t.lower() for t in query_tokens):
+            pos = int(np.searchsorted(self.terms, term))
+            if pos >= len(self.terms) or self.terms[pos] != term:
+                continue
+            start, end = self.offsets[pos], self.offsets[pos + 1]
+            rows = self.postings_rows[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = np.log1p((n_chunks - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[rows] / max(self.avg_length, 1e-6))
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def score_of(self, scores: np.ndarray, chunk_id: str) -> float:
+        row = self._rows.get(chunk_id)
+        return float(scores[row]) if row is not None else 0.0
+
+    def top_k(self, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.chunk_ids[i]), float(scores[i])) for i in top]
+
+
+class BM25IndexBuilder:
+    def __init__(self):
+        self.chunk_ids = []
+        self.term_counts = []
+
+    def add(self, chunk_id: str, tokens: List[str]):
+        self.chunk_ids.append(chunk_id)
+        self.term_counts.append(Counter(t.lower() for t in tokens if t.strip()))
+
+    def build(self) -> BM25Index:
+        vocab = sorted(set().union(*self.term_counts)) if self.term_counts else []
+        term_ids = {term: i for i, term in enumerate(vocab)}
+
+        rows, terms, tfs = [], [], []
+        for row, counts in enumerate(self.term_counts):
+            for term, tf in counts.items():
+                rows.append(row)
+                terms.append(term_ids[term])
+                tfs.append(tf)
+
+        terms = np.asarray(terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+        return BM25Index(
+            np.array(vocab, dtype=str),
+            np.array(self.chunk_ids, dtype=str),
+            np.array([sum(c.values()) for c in self.term_counts], dtype=np.float32),
+            offsets,
+            np.asarray(rows, dtype=np.int32)[order],
+            np.asarray(tfs, dtype=np.float32)[order],
+        )
+
+
+def index_path(namespace: str, document_id: str) -> Path:
+    return BM25_INDEX_DIR / quote(namespace, safe="") / f"{quote(document_id, safe='')}.npz"
+
+
+async def save_bm25_index(namespace: str, document_id: str, builder: BM25IndexBuilder):
+    index = await asyncio.to_thread(builder.build)
+    await asyncio.to_thread(index.save, index_path(namespace, document_id))
+    _indexes[(namespace, document_id)] = index
+    return index
+
+
+async def load_bm25_index(namespace: str, document_id: str) -> BM25Index | None:
+    key = (namespace, document_id)
+    if key not in _indexes:
+        path = index_path(namespace, document_id)
+        if not path.exists():
+            return None
+        _indexes[key] = await asyncio.to_thread(BM25Index.load, path)
+    return _indexes[key]
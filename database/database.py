@@ -1,12 +1,20 @@
 import os
+import json
+import base64
+import asyncio
+import logging
+from datetime import date, datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from urllib.parse import urlparse, parse_qs
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Index, func, text, select, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from contextlib import asynccontextmanager
 
+logger = logging.getLogger(__name__)
+
 CURRENT = Path(__file__).resolve()
 PROJECT_ROOT = CURRENT.parents[1]
 load_dotenv(PROJECT_ROOT / ".env")
@@ -16,6 +24,12 @@ result = urlparse(url)
 query_params = parse_qs(result.query)
 sslmode = query_params.get("sslmode", ["require"])[0]
 
+# asyncpg caps a statement at 32767 bind parameters; 6 per metric row.
+METRIC_UPSERT_BATCH = int(os.getenv("METRIC_UPSERT_BATCH", "1000"))
+METRIC_FLUSH_ROWS = int(os.getenv("METRIC_FLUSH_ROWS", "5000"))
+METRIC_PAGE_SIZE = 100
+METRIC_MAX_PAGE_SIZE = 1000
+
 ASYNC_DB_URL = f"postgresql+asyncpg://{result.username}:{result.password}@{result.hostname}:{result.port or 5432}/{result.path[1:]}?sslmode={sslmode}"
 
 Base = declarative_base()
@@ -34,6 +48,10 @@ class Organization(Base):
 
 class ESGMetric(Base):
     __tablename__ = "esg_metric"
+    __table_args__ = (
+        Index("uq_esg_metric_org_indicator_year", "organization_id", "indicator_name", "reporting_year", unique=True),
+        Index("ix_esg_metric_org_indicator_created", "organization_id", "indicator_name", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     organization_id = Column(Integer, ForeignKey("organization.id", ondelete="CASCADE"))
@@ -41,12 +59,29 @@ class ESGMetric(Base):
     indicator_name = Column(String(255))
     value = Column(Numeric)
     unit = Column(String(50))
+    reporting_year = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     organization = relationship("Organization", back_populates="esg_metrics")
 
 
+class ESGMetricLatest(Base):
+    """Most recent non-null value per organization and indicator, kept in step with esg_metric."""
+    __tablename__ = "esg_metric_latest"
+    __table_args__ = (
+        Index("ix_esg_metric_latest_indicator_org", "indicator_name", "organization_id"),
+    )
+
+    organization_id = Column(Integer, ForeignKey("organization.id", ondelete="CASCADE"), primary_key=True)
+    indicator_name = Column(String(255), primary_key=True)
+    category = Column(String(50))
+    value = Column(Numeric)
+    unit = Column(String(50))
+    reporting_year = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 engine = create_async_engine(
     ASYNC_DB_URL,
     echo=False,
@@ -72,20 +107,205 @@ async def get_async_session():
             raise
 
 
-async def insert_esg_metrics_async(organization_id, esg_data):
+# Rows written before reporting_year existed keep NULL, which Postgres treats
+# as distinct, so the unique index can be added without deduplicating them.
+SCHEMA_MIGRATIONS = [
+    "ALTER TABLE esg_metric ADD COLUMN IF NOT EXISTS reporting_year INTEGER",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_esg_metric_org_indicator_year "
+    "ON esg_metric (organization_id, indicator_name, reporting_year)",
+    "CREATE INDEX IF NOT EXISTS ix_esg_metric_org_indicator_created "
+    "ON esg_metric (organization_id, indicator_name, created_at)",
+    # Seed the summary table once, from whatever esg_metric already holds.
+    "INSERT INTO esg_metric_latest (organization_id, indicator_name, category, value, unit, reporting_year) "
+    "SELECT DISTINCT ON (organization_id, indicator_name) organization_id, indicator_name, category, value, unit, reporting_year "
+    "FROM esg_metric WHERE value IS NOT NULL AND organization_id IS NOT NULL AND indicator_name IS NOT NULL "
+    "AND NOT EXISTS (SELECT 1 FROM esg_metric_latest) "
+    "ORDER BY organization_id, indicator_name, reporting_year DESC NULLS LAST, created_at DESC "
+    "ON CONFLICT DO NOTHING",
+]
+
+
+async def ensure_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_MIGRATIONS:
+            await conn.execute(text(statement))
+
+
+def metric_rows(organization_id, esg_data, reporting_year: int | None = None):
+    reporting_year = reporting_year or date.today().year
+    rows = {}
+    for category, indicators in esg_data.items():
+        for name, data in indicators.items():
+            # Entries without an indicator name (e.g. Report_Year) would never
+            # hit the unique index and append a row on every run.
+            if name is None:
+                continue
+            rows[name] = {
+                "organization_id": int(organization_id),
+                "category": category,
+                "indicator_name": name,
+                "value": data.get("value"),
+                "unit": data.get("unit"),
+                "reporting_year": reporting_year,
+            }
+    return list(rows.values())
+
+
+async def upsert_esg_metrics(rows):
+    # One row per key: ON CONFLICT cannot touch the same row twice in a statement.
+    rows = list({(r["organization_id"], r["indicator_name"], r["reporting_year"]): r for r in rows}.values())
+    if not rows:
+        return 0
+
     async with get_async_session() as session:
-        metrics = []
-        for category, indicators in esg_data.items():
-            for name, data in indicators.items():
-                metrics.append(ESGMetric(
-                    organization_id=organization_id,
-                    category=category,
-                    indicator_name=name,
-                    value=data.get("value"),
-                    unit=data.get("unit")
-                ))
-        session.add_all(metrics)
-        await session.flush()
+        for start in range(0, len(rows), METRIC_UPSERT_BATCH):
+            stmt = pg_insert(ESGMetric).values(rows[start:start + METRIC_UPSERT_BATCH])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["organization_id", "indicator_name", "reporting_year"],
+                set_={
+                    "category": stmt.excluded.category,
+                    "value": stmt.excluded.value,
+                    "unit": stmt.excluded.unit,
+                    "updated_at": func.now(),
+                }
+            )
+            await session.execute(stmt)
+
+            latest = [r for r in rows[start:start + METRIC_UPSERT_BATCH] if r["value"] is not None]
+            if latest:
+                await session.execute(latest_upsert(latest))
+    return len(rows)
+
+
+def latest_upsert(rows):
+    stmt = pg_insert(ESGMetricLatest).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["organization_id", "indicator_name"],
+        set_={
+            "category": stmt.excluded.category,
+            "value": stmt.excluded.value,
+            "unit": stmt.excluded.unit,
+            "reporting_year": stmt.excluded.reporting_year,
+            "updated_at": func.now(),
+        },
+        # An older year re-extracted later must not replace a newer value.
+        where=or_(
+            ESGMetricLatest.reporting_year.is_(None),
+            stmt.excluded.reporting_year >= ESGMetricLatest.reporting_year
+        )
+    )
+
+
+async def insert_esg_metrics_async(organization_id, esg_data, reporting_year: int | None = None):
+    return await upsert_esg_metrics(metric_rows(organization_id, esg_data, reporting_year))
+
+
+class MetricWriteBuffer:
+    """Write-behind buffer that batches metric upserts across organizations."""
+
+    def __init__(self, max_rows: int = METRIC_FLUSH_ROWS):
+        self.max_rows = max_rows
+        self.rows = []
+        self.written = 0
+        self._lock = asyncio.Lock()
+
+    async def add(self, organization_id, esg_data, reporting_year: int | None = None):
+        self.rows.extend(metric_rows(organization_id, esg_data, reporting_year))
+        if len(self.rows) >= self.max_rows:
+            try:
+                await self.flush()
+            except Exception as e:
+                # Rows stay buffered; the final flush retries and reports.
+                logger.warning(f"Metric write-behind flush failed: {str(e)}")
+
+    async def flush(self):
+        async with self._lock:
+            rows, self.rows = self.rows, []
+            if rows:
+                try:
+                    self.written += await upsert_esg_metrics(rows)
+                except Exception:
+                    self.rows = rows + self.rows
+                    raise
+        return self.written
+
+def encode_cursor(values) -> str:
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def page_limit(limit: int | None) -> int:
+    return max(1, min(limit or METRIC_PAGE_SIZE, METRIC_MAX_PAGE_SIZE))
+
+
+def metric_to_dict(metric) -> dict:
+    return {column.name: getattr(metric, column.name) for column in metric.__table__.columns}
+
+
+async def fetch_page(stmt, limit: int, cursor_of):
+    async with get_async_session() as session:
+        metrics = (await session.execute(stmt.limit(limit + 1))).scalars().all()
+    next_cursor = encode_cursor(cursor_of(metrics[limit - 1])) if len(metrics) > limit else None
+    return [metric_to_dict(m) for m in metrics[:limit]], next_cursor
+
+
+async def query_organization_metrics(organization_id, cursor: str | None = None, limit: int | None = None):
+    """Latest value of every indicator for one organization, by indicator name."""
+    limit = page_limit(limit)
+    stmt = (
+        select(ESGMetricLatest)
+        .where(ESGMetricLatest.organization_id == int(organization_id))
+        .order_by(ESGMetricLatest.indicator_name)
+    )
+    if cursor:
+        (after,) = decode_cursor(cursor, 1)
+        stmt = stmt.where(ESGMetricLatest.indicator_name > after)
+    return await fetch_page(stmt, limit, lambda m: [m.indicator_name])
+
+
+async def query_indicator_metrics(indicator_name: str, cursor: str | None = None, limit: int | None = None):
+    """Latest value of one indicator across organizations, by organization id."""
+    limit = page_limit(limit)
+    stmt = (
+        select(ESGMetricLatest)
+        .where(ESGMetricLatest.indicator_name == indicator_name)
+        .order_by(ESGMetricLatest.organization_id)
+    )
+    if cursor:
+        (after,) = decode_cursor(cursor, 1)
+        stmt = stmt.where(ESGMetricLatest.organization_id > int(after))
+    return await fetch_page(stmt, limit, lambda m: [m.organization_id])
+
+
+async def query_metric_history(organization_id, indicator_name: str | None = None, cursor: str | None = None, limit: int | None = None):
+    """Every stored value for one organization, ordered by indicator then time."""
+    limit = page_limit(limit)
+    stmt = (
+        select(ESGMetric)
+        .where(ESGMetric.organization_id == int(organization_id))
+        .order_by(ESGMetric.indicator_name, ESGMetric.created_at, ESGMetric.id)
+    )
+    if indicator_name:
+        stmt = stmt.where(ESGMetric.indicator_name == indicator_name)
+    if cursor:
+        name, created_at, metric_id = decode_cursor(cursor, 3)
+        stmt = stmt.where(
+            tuple_(ESGMetric.indicator_name, ESGMetric.created_at, ESGMetric.id)
+            > tuple_(name, datetime.fromisoformat(created_at), int(metric_id))
+        )
+    return await fetch_page(stmt, limit, lambda m: [m.indicator_name, m.created_at, m.id])
+
 
 async def onboard_organization(name: str, country: str | None = None):
     async with get_async_session() as session:
@@ -0,0 +1,80 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+DOCUMENT_REGISTRY_PATH = Path(os.getenv("DOCUMENT_REGISTRY_PATH", CACHE_DIR / "documents.sqlite3"))
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DOCUMENT_REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DOCUMENT_REGISTRY_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                namespace TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                filename TEXT,
+                path TEXT,
+                status TEXT NOT NULL,
+                chunk_count INTEGER,
+                index_version TEXT,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (namespace, content_hash)
+            )
+            """
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+        if "index_version" not in columns:
+            conn.execute("ALTER TABLE documents ADD COLUMN index_version TEXT")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _get_document(namespace: str, content_hash: str):
+    with _conn_lock:
+        row = _connect().execute(
+            "SELECT * FROM documents WHERE namespace = ? AND content_hash = ?",
+            (namespace, content_hash)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def _set_status(namespace: str, content_hash: str, status: str, filename=None, path=None, chunk_count=None, index_version=None):
+    with _conn_lock:
+        conn = _connect()
+        conn.execute(
+            """
+            INSERT INTO documents (namespace, content_hash, filename, path, status, chunk_count, index_version)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, content_hash) DO UPDATE SET
+                filename = COALESCE(excluded.filename, documents.filename),
+                path = COALESCE(excluded.path, documents.path),
+                status = excluded.status,
+                chunk_count = COALESCE(excluded.chunk_count, documents.chunk_count),
+                index_version = COALESCE(excluded.index_version, documents.index_version),
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (namespace, content_hash, filename, path, status, chunk_count, index_version)
+        )
+        conn.commit()
+
+
+async def get_document(namespace: str, content_hash: str):
+    return await asyncio.to_thread(_get_document, namespace, content_hash)
+
+
+async def set_document_status(namespace: str, content_hash: str, status: str, filename: str | None = None, path: str | None = None, chunk_count: int | None = None, index_version: str | None = None):
+    await asyncio.to_thread(_set_status, namespace, content_hash, status, filename, path, chunk_count, index_version)
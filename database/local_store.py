@@ -0,0 +1,312 @@
+import os
+import json
+import shutil
+import asyncio
+import logging
+from pathlib import Path
+from collections import OrderedDict
+from urllib.parse import quote
+from typing import List, Dict, Any
+import numpy as np
+from database.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOCAL_VECTOR_DIR = Path(os.getenv("LOCAL_VECTOR_DIR", PROJECT_ROOT / "cache" / "vectors"))
+LOCAL_VECTOR_SEARCH = os.getenv("LOCAL_VECTOR_SEARCH", "exact")
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", "2048"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_ITERATIONS = 10
+LOCAL_SEGMENT_CACHE = int(os.getenv("LOCAL_SEGMENT_CACHE", "32"))
+
+_MISSING = object()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+
+def build_ivf(matrix: np.ndarray, iterations: int = IVF_ITERATIONS):
+    n = len(matrix)
+    nlist = max(1, int(np.sqrt(n)))
+    rng = np.random.default_rng(0)
+    centroids = np.array(matrix[rng.choice(n, nlist, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = matrix[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = normalize_rows(centroids)
+
+    assign = np.argmax(matrix @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+    return centroids, order, offsets
+
+
+class LocalVectorStore(VectorStore):
+    """In-process store keeping one float32 matrix per namespace/document.
+
+    Each document lives in ``<root>/<namespace>/<document_id>/``:
+    ``vectors.f32`` holds L2-normalised rows (memory-mapped on load),
+    ``meta.jsonl`` one line per upserted record with its row and metadata,
+    and ``texts.jsonl`` the chunk texts, which are read back only for
+    matches so loaded documents keep just the small metadata in memory.
+    Upserts append, so ingest writes grow with the batch rather than the
+    document; a re-sent id rewrites its row and its newest line wins.
+    Scores are cosine similarities, like a cosine Pinecone index.  With
+    ``search="ivf"`` documents larger than IVF_MIN_VECTORS are searched
+    through a k-means inverted file persisted as ``ivf.npz``.  At most
+    ``cache_size`` documents stay loaded.
+    """
+
+    def __init__(self, root: Path = LOCAL_VECTOR_DIR, search: str = LOCAL_VECTOR_SEARCH, nprobe: int = IVF_NPROBE, cache_size: int = LOCAL_SEGMENT_CACHE):
+        if search not in ("exact", "ivf"):
+            raise ValueError(f"Unknown local vector search mode: {search}")
+        self.root = Path(root)
+        self.search = search
+        self.nprobe = nprobe
+        self.cache_size = cache_size
+        self._segments: OrderedDict = OrderedDict()
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+
+    def _segment_dir(self, namespace: str, document_id: str) -> Path:
+        return self.root / quote(namespace, safe="") / quote(document_id, safe="")
+
+    def _lock(self, key) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _remember(self, key, segment):
+        self._segments[key] = segment
+        self._segments.move_to_end(key)
+        while len(self._segments) > self.cache_size:
+            self._segments.popitem(last=False)
+
+    def _map_matrix(self, segment):
+        rows = len(segment["ids"])
+        if rows:
+            segment["matrix"] = np.memmap(segment["path"] / "vectors.f32", dtype=np.float32, mode="r", shape=(rows, segment["dim"]))
+        else:
+            segment["matrix"] = np.empty((0, segment["dim"]), dtype=np.float32)
+        segment["ivf"] = None
+        return segment
+
+    def _load_segment(self, path: Path):
+        meta_path = path / "meta.jsonl"
+        if not meta_path.exists():
+            if not (path / "meta.json").exists():
+                return None
+            self._migrate_legacy(path)
+
+        with open(path / "segment.json", encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        segment = {"path": path, "dim": dim, "ids": [], "positions": {}, "metadata": [], "text_offsets": []}
+
+        valid_bytes = 0
+        with open(meta_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    break
+                valid_bytes += len(line)
+                self._apply_entry(segment, entry)
+        if valid_bytes < meta_path.stat().st_size:
+            # A torn last line from an interrupted upsert; its rows are rewritten on retry.
+            logger.warning(f"Truncating incomplete metadata in {meta_path}")
+            with open(meta_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+        return self._map_matrix(segment)
+
+    def _apply_entry(self, segment, entry):
+        pos = entry["row"]
+        if pos == len(segment["ids"]):
+            segment["positions"][entry["id"]] = pos
+            segment["ids"].append(entry["id"])
+            segment["metadata"].append(entry["metadata"])
+            segment["text_offsets"].append(entry["text"])
+        else:
+            segment["metadata"][pos] = entry["metadata"]
+            segment["text_offsets"][pos] = entry["text"]
+
+    def _migrate_legacy(self, path: Path):
+        # Segments written before appends existed: one vectors.npy and meta.json.
+        logger.info(f"Migrating local vector segment {path}")
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(path / "vectors.npy", mmap_mode="r")
+        records = [{"id": vid, "values": matrix[i], "metadata": metadata} for i, (vid, metadata) in enumerate(zip(meta["ids"], meta["metadata"]))]
+        if records:
+            self._append_segment(path, None, records)
+        else:
+            with open(path / "segment.json", "w", encoding="utf-8") as f:
+                json.dump({"dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0}, f)
+            (path / "meta.jsonl").touch()
+        (path / "vectors.npy").unlink()
+        (path / "meta.json").unlink()
+
+    def _append_segment(self, path: Path, segment, records: List[Dict[str, Any]]):
+        new_rows = normalize_rows(np.asarray([r["values"] for r in records], dtype=np.float32))
+        if segment is None:
+            path.mkdir(parents=True, exist_ok=True)
+            with open(path / "segment.json", "w", encoding="utf-8") as f:
+                json.dump({"dim": new_rows.shape[1]}, f)
+            segment = {"path": path, "dim": new_rows.shape[1], "ids": [], "positions": {}, "metadata": [], "text_offsets": []}
+        elif segment["dim"] != new_rows.shape[1]:
+            raise ValueError(f"Vector dimension {new_rows.shape[1]} does not match stored dimension {segment['dim']}")
+
+        # Rows and texts go to disk before the metadata lines that reference
+        # them, so a crash leaves at most unreferenced bytes behind.
+        entries = []
+        next_row = len(segment["ids"])
+        vectors_path = path / "vectors.f32"
+        with open(vectors_path, "r+b" if vectors_path.exists() else "w+b") as vectors, open(path / "texts.jsonl", "ab") as texts:
+            for record, row in zip(records, new_rows):
+                pos = segment["positions"].get(record["id"])
+                if pos is None:
+                    pos = next_row
+                    next_row += 1
+                vectors.seek(pos * row.nbytes)
+                vectors.write(row.tobytes())
+
+                metadata = dict(record.get("metadata") or {})
+                text = metadata.pop("chunk_text", None)
+                offset = None
+                if text is not None:
+                    offset = texts.tell()
+                    texts.write(json.dumps(text).encode("utf-8") + b"\n")
+                entries.append({"id": record["id"], "row": pos, "metadata": metadata, "text": offset})
+
+        with open(path / "meta.jsonl", "ab") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8"))
+        (path / "ivf.npz").unlink(missing_ok=True)
+
+        for entry in entries:
+            self._apply_entry(segment, entry)
+        return self._map_matrix(segment)
+
+    def _full_metadata(self, segment, positions: List[int]) -> List[Dict[str, Any]]:
+        full = [dict(segment["metadata"][pos]) for pos in positions]
+        offsets = [segment["text_offsets"][pos] for pos in positions]
+        if any(offset is not None for offset in offsets):
+            with open(segment["path"] / "texts.jsonl", "rb") as texts:
+                for metadata, offset in zip(full, offsets):
+                    if offset is not None:
+                        texts.seek(offset)
+                        metadata["chunk_text"] = json.loads(texts.readline())
+        return full
+
+    async def _get_segment(self, namespace: str, document_id: str):
+        key = (namespace, document_id)
+        segment = self._segments.get(key, _MISSING)
+        if segment is not _MISSING:
+            self._segments.move_to_end(key)
+            return segment
+        async with self._lock(key):
+            segment = self._segments.get(key, _MISSING)
+            if segment is _MISSING:
+                path = self._segment_dir(namespace, document_id)
+                segment = await asyncio.to_thread(self._load_segment, path)
+            self._remember(key, segment)
+        return segment
+
+    async def upsert(self, namespace: str, vectors: List[Dict[str, Any]]):
+        by_document: Dict[str, List[Dict[str, Any]]] = {}
+        for record in vectors:
+            document_id = (record.get("metadata") or {}).get("document_id", "")
+            by_document.setdefault(document_id, []).append(record)
+
+        for document_id, records in by_document.items():
+            key = (namespace, document_id)
+            path = self._segment_dir(namespace, document_id)
+            async with self._lock(key):
+                segment = self._segments.get(key, _MISSING)
+                if segment is _MISSING:
+                    segment = await asyncio.to_thread(self._load_segment, path)
+                self._remember(key, await asyncio.to_thread(self._append_segment, path, segment, records))
+
+        return {"upserted_count": len(vectors)}
+
+    async def delete_document(self, namespace: str, document_id: str):
+        key = (namespace, document_id)
+        async with self._lock(key):
+            self._segments.pop(key, None)
+            await asyncio.to_thread(shutil.rmtree, self._segment_dir(namespace, document_id), True)
+
+    def _fetch(self, segment, ids: List[str]) -> List[Dict[str, Any]]:
+        found = [(vector_id, segment["positions"][vector_id]) for vector_id in ids if vector_id in segment["positions"]]
+        metadata = self._full_metadata(segment, [pos for _, pos in found])
+        return [
+            {"id": vector_id, "values": segment["matrix"][pos].tolist(), "metadata": meta}
+            for (vector_id, pos), meta in zip(found, metadata)
+        ]
+
+    async def fetch(self, namespace: str, document_id: str, ids: List[str]) -> List[Dict[str, Any]]:
+        segment = await self._get_segment(namespace, document_id)
+        if segment is None:
+            return []
+        return await asyncio.to_thread(self._fetch, segment, ids)
+
+    def _ivf_candidates(self, path: Path, segment, matrix: np.ndarray, query: np.ndarray):
+        ivf = segment["ivf"]
+        if ivf is None:
+            ivf_path = path / "ivf.npz"
+            if ivf_path.exists():
+                with np.load(ivf_path) as data:
+                    ivf = (data["centroids"], data["order"], data["offsets"])
+            # An index saved while an upsert was landing may miss its rows.
+            if ivf is None or len(ivf[1]) != len(matrix):
+                ivf = build_ivf(matrix)
+                centroids, order, offsets = ivf
+                np.savez(path / "ivf.tmp.npz", centroids=centroids, order=order, offsets=offsets)
+                os.replace(path / "ivf.tmp.npz", ivf_path)
+            segment["ivf"] = ivf
+
+        centroids, order, offsets = ivf
+        probe = np.argsort(-(centroids @ query))[:self.nprobe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+
+    def _search(self, path: Path, segment, vector, top_k: int) -> List[Dict[str, Any]]:
+        matrix = segment["matrix"]
+        if not len(matrix) or top_k <= 0:
+            return []
+
+        query = normalize_rows(np.asarray(vector, dtype=np.float32)[None, :])[0]
+        if self.search == "ivf" and len(matrix) >= IVF_MIN_VECTORS:
+            rows = self._ivf_candidates(path, segment, matrix, query)
+            scores = matrix[rows] @ query
+        else:
+            rows = np.arange(len(matrix))
+            scores = matrix @ query
+
+        if not len(scores):
+            return []
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        metadata = self._full_metadata(segment, [int(rows[i]) for i in top])
+        return [
+            {
+                "id": segment["ids"][rows[i]],
+                "score": float(scores[i]),
+                "metadata": meta,
+            }
+            for i, meta in zip(top, metadata)
+        ]
+
+    async def query(self, namespace: str, vector: List[float], document_id: str, top_k: int) -> List[Dict[str, Any]]:
+        segment = await self._get_segment(namespace, document_id)
+        if segment is None:
+            return []
+        path = self._segment_dir(namespace, document_id)
+        return await asyncio.to_thread(self._search, path, segment, vector, top_k)
@@ -0,0 +1,134 @@
+import os
+import asyncio
+from collections import defaultdict
+from typing import List, Dict, Any
+from pinecone import Pinecone
+from database.vector_store import VectorStore
+from src.metrics import increment
+
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "index")
+
+
+def to_match(match) -> Dict[str, Any]:
+    if isinstance(match, dict):
+        return {
+            "id": (match.get("id") or "").strip(),
+            "score": match.get("score", 0.0),
+            "metadata": match.get("metadata") or {},
+        }
+    return {
+        "id": (getattr(match, "id", "") or "").strip(),
+        "score": getattr(match, "score", 0.0),
+        "metadata": getattr(match, "metadata", None) or {},
+    }
+
+
+def to_matches(result) -> List[Dict[str, Any]]:
+    if hasattr(result, "matches"):
+        matches = result.matches
+    elif isinstance(result, dict):
+        matches = result.get("matches", [])
+    else:
+        matches = []
+    return [to_match(m) for m in matches or []]
+
+
+class PineconeVectorStore(VectorStore):
+    def __init__(self, api_key: str | None = None, index_name: str = PINECONE_INDEX_NAME):
+        self.api_key = api_key or os.getenv("PINECONE_API_KEY")
+        if not self.api_key:
+            raise RuntimeError("PINECONE_API_KEY not found — check your .env file")
+        self.index_name = index_name
+        self._pc = None
+        self._index = None
+        self._index_lock = asyncio.Lock()
+
+    async def get_index(self):
+        async with self._index_lock:
+            if self._index is None:
+                if self._pc is None:
+                    self._pc = Pinecone(api_key=self.api_key)
+                index_info = await asyncio.to_thread(self._pc.describe_index, self.index_name)
+                self._index = self._pc.Index(host=index_info["host"], name=self.index_name)
+        return self._index
+
+    async def upsert(self, namespace: str, vectors: List[Dict[str, Any]]):
+        index = await self.get_index()
+        return await asyncio.to_thread(
+            index.upsert,
+            namespace=namespace,
+            vectors=vectors
+        )
+
+    async def fetch(self, namespace: str, document_id: str, ids: List[str]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        index = await self.get_index()
+        result = await asyncio.to_thread(index.fetch, ids=list(ids), namespace=namespace)
+        vectors = result.get("vectors", {}) if isinstance(result, dict) else getattr(result, "vectors", {})
+        fetched = []
+        for vector_id, vector in (vectors or {}).items():
+            if isinstance(vector, dict):
+                values, metadata = vector.get("values"), vector.get("metadata")
+            else:
+                values, metadata = getattr(vector, "values", None), getattr(vector, "metadata", None)
+            fetched.append({"id": vector_id, "values": list(values or []), "metadata": metadata or {}})
+        return fetched
+
+    async def delete_document(self, namespace: str, document_id: str):
+        index = await self.get_index()
+
+        def _delete():
+            # Vector ids are "<document_id>#p<page>c<chunk>"; serverless indexes
+            # can list them by prefix, pod-based ones delete by metadata filter.
+            try:
+                for ids in index.list(prefix=f"{document_id}#", namespace=namespace):
+                    if ids:
+                        index.delete(ids=list(ids), namespace=namespace)
+            except Exception:
+                index.delete(filter={"document_id": {"$eq": document_id}}, namespace=namespace)
+
+        await asyncio.to_thread(_delete)
+
+    async def _query(self, namespace: str, vector: List[float], top_k: int, filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        index = await self.get_index()
+        result = await asyncio.to_thread(
+            index.query,
+            namespace=namespace,
+            vector=vector,
+            top_k=top_k,
+            filter=filter,
+            include_metadata=True,
+            include_values=False
+        )
+        increment("pinecone.queries")
+        return to_matches(result)
+
+    async def query(self, namespace: str, vector: List[float], document_id: str, top_k: int) -> List[Dict[str, Any]]:
+        return await self._query(namespace, vector, top_k, {"document_id": {"$eq": document_id}})
+
+    async def query_many(self, namespace: str, vector: List[float], document_ids: List[str], top_k: int) -> List[Dict[str, Any]]:
+        if len(document_ids) == 1:
+            return await self.query(namespace, vector, document_ids[0], top_k)
+
+        requested = top_k * len(document_ids)
+        matches = await self._query(namespace, vector, requested, {"document_id": {"$in": list(document_ids)}})
+
+        per_doc = defaultdict(list)
+        for match in matches:
+            per_doc[match["metadata"].get("document_id")].append(match)
+
+        # A saturated result may have been crowded out by one document; re-query
+        # the documents that came back short so each still gets its own top_k.
+        short = []
+        if len(matches) >= requested:
+            short = [doc_id for doc_id in document_ids if len(per_doc[doc_id]) < top_k]
+        if short:
+            increment("pinecone.followup_queries", len(short))
+            refills = await asyncio.gather(
+                *[self.query(namespace, vector, doc_id, top_k) for doc_id in short]
+            )
+            for doc_id, doc_matches in zip(short, refills):
+                per_doc[doc_id] = doc_matches
+
+        return [match for doc_id in document_ids for match in per_doc[doc_id][:top_k]]
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+
+FUSION_STRATEGY = os.getenv("FUSION_STRATEGY", "linear")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+DENSE_WEIGHT = float(os.getenv("DENSE_WEIGHT", "0.7"))
+LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "0.3"))
+RRF_K = 60
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def ranks(scores: np.ndarray) -> np.ndarray:
+    order = np.argsort(-scores, kind="stable")
+    result = np.empty(len(scores), dtype=np.float32)
+    result[order] = np.arange(1, len(scores) + 1, dtype=np.float32)
+    return result
+
+
+def zscore(scores: np.ndarray) -> np.ndarray:
+    std = float(scores.std())
+    if std < 1e-6:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+
+def linear_fusion(dense: np.ndarray, lexical: np.ndarray, weights) -> np.ndarray:
+    lexical = lexical / max(float(lexical.max()), 1e-6)
+    return weights[0] * dense + weights[1] * lexical
+
+
+def reciprocal_rank_fusion(dense: np.ndarray, lexical: np.ndarray, weights) -> np.ndarray:
+    return weights[0] / (RRF_K + ranks(dense)) + weights[1] / (RRF_K + ranks(lexical))
+
+
+def zscore_fusion(dense: np.ndarray, lexical: np.ndarray, weights) -> np.ndarray:
+    return weights[0] * zscore(dense) + weights[1] * zscore(lexical)
+
+
+FUSION_STRATEGIES = {
+    "linear": linear_fusion,
+    "rrf": reciprocal_rank_fusion,
+    "zscore": zscore_fusion,
+}
+
+
+def rank_candidates(dense, lexical, k: int = RERANK_TOP_K, strategy: str = FUSION_STRATEGY, weights=(DENSE_WEIGHT, LEXICAL_WEIGHT)):
+    if strategy not in FUSION_STRATEGIES:
+        raise ValueError(f"Unknown fusion strategy: {strategy}")
+    dense = np.asarray(dense, dtype=np.float32)
+    lexical = np.asarray(lexical, dtype=np.float32)
+    if not len(dense):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    fused = FUSION_STRATEGIES[strategy](dense, lexical, weights).astype(np.float32, copy=False)
+    top = top_k_indices(fused, k)
+    return top, fused[top]
@@ -1,13 +1,30 @@
+import os
+import json
+import sqlite3
+import threading
 import numpy as np
 import asyncio
+import logging
 import spacy
+from pathlib import Path
 from typing import List, Tuple
 from rank_bm25 import BM25Okapi
+from database.ranking import rank_candidates, top_k_indices, FUSION_STRATEGY, RERANK_TOP_K, DENSE_WEIGHT, LEXICAL_WEIGHT
 
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+LEMMA_CACHE_PATH = Path(os.getenv("LEMMA_CACHE_PATH", CACHE_DIR / "lemmas.sqlite3"))
+LEMMA_BATCH_SIZE = 64
+SQLITE_MAX_PARAMS = 900
 
 _english_nlp = None
 _nlp_lock = asyncio.Lock()
 
+_lemma_conn = None
+_lemma_conn_lock = threading.Lock()
+
 
 
 async def get_spacy_nlp():
@@ -15,8 +32,10 @@ async def get_spacy_nlp():
     if _english_nlp is None:
         async with _nlp_lock:
             if _english_nlp is None:
+                # Lemmas only need the tagger and attribute ruler; the parser
+                # and NER are the bulk of the pipeline's cost.
                 _english_nlp = await asyncio.to_thread(
-                    spacy.load, "en_core_web_sm"
+                    spacy.load, "en_core_web_sm", disable=["parser", "ner"]
                 )
     return _english_nlp
 
@@ -33,46 +52,120 @@ async def get_english_lemmas(text: str) -> List[str]:
         return []
 
 
-async def get_top_chunks_with_bm25(chunk_texts,chunk_ids,distances,query) -> Tuple[List[str], List[str], List[float]]:
-    if not chunk_texts:
-        return [], [], []
-    n = min(len(chunk_texts), len(chunk_ids), len(distances))
-    chunk_texts = chunk_texts[:n]
-    chunk_ids = chunk_ids[:n]
-    distances = distances[:n]
+async def lemmatize_texts(texts: List[str]) -> List[List[str]]:
+    if not texts:
+        return []
+    nlp = await get_spacy_nlp()
+
+    def _pipe():
+        return [
+            [t.lemma_ for t in doc if not t.is_space]
+            for doc in nlp.pipe((text or "" for text in texts), batch_size=LEMMA_BATCH_SIZE)
+        ]
+
+    return await asyncio.to_thread(_pipe)
+
+
+def _lemma_db() -> sqlite3.Connection:
+    global _lemma_conn
+    if _lemma_conn is None:
+        LEMMA_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(LEMMA_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS chunk_lemmas (chunk_id TEXT PRIMARY KEY, tokens TEXT NOT NULL)")
+        conn.commit()
+        _lemma_conn = conn
+    return _lemma_conn
+
+
+def _load_lemmas(chunk_ids: List[str]) -> dict:
+    found = {}
+    with _lemma_conn_lock:
+        conn = _lemma_db()
+        for start in range(0, len(chunk_ids), SQLITE_MAX_PARAMS):
+            batch = chunk_ids[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            for chunk_id, tokens in conn.execute(
+                f"SELECT chunk_id, tokens FROM chunk_lemmas WHERE chunk_id IN ({placeholders})", batch
+            ):
+                found[chunk_id] = json.loads(tokens)
+    return found
+
+
+def _save_lemmas(lemmas: dict):
+    with _lemma_conn_lock:
+        conn = _lemma_db()
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_lemmas (chunk_id, tokens) VALUES (?, ?)",
+            [(chunk_id, json.dumps(tokens)) for chunk_id, tokens in lemmas.items()]
+        )
+        conn.commit()
+
+
+async def store_chunk_lemmas(chunk_ids: List[str], chunk_texts: List[str]) -> List[List[str]]:
+    # Lexical scoring is optional; a missing spaCy model must not fail ingestion.
+    try:
+        tokens = await lemmatize_texts(chunk_texts)
+        await asyncio.to_thread(_save_lemmas, dict(zip(chunk_ids, tokens)))
+        return tokens
+    except Exception as e:
+        logger.warning(f"Lemmatization failed, indexing {len(chunk_ids)} chunks without lexical tokens: {str(e)}")
+        return [[] for _ in chunk_ids]
 
-    tokenized_chunks = await asyncio.gather(
-        *[get_english_lemmas(text or "") for text in chunk_texts]
-    )
-    query_tokens = await get_english_lemmas(query or "")
 
-    def _rank(tokenized_chunks, query_tokens):
-        if not any(tokenized_chunks):
-            similarity_scores = 1 - np.array(distances, dtype=float)
-            return chunk_texts, chunk_ids, similarity_scores.tolist()
+async def get_chunk_lemmas(chunk_ids: List[str], chunk_texts: List[str]) -> List[List[str]]:
+    try:
+        cached = await asyncio.to_thread(_load_lemmas, list(chunk_ids))
+        missing = [(cid, text) for cid, text in zip(chunk_ids, chunk_texts) if cid not in cached]
+        if missing:
+            missing_ids = [cid for cid, _ in missing]
+            missing_tokens = await lemmatize_texts([text for _, text in missing])
+            new_lemmas = dict(zip(missing_ids, missing_tokens))
+            await asyncio.to_thread(_save_lemmas, new_lemmas)
+            cached.update(new_lemmas)
+        return [cached.get(cid, []) for cid in chunk_ids]
+    except Exception:
+        return [[] for _ in chunk_ids]
+
 
-        bm25 = BM25Okapi(tokenized_chunks)
+async def get_top_chunks_with_bm25(chunk_texts,chunk_ids,similarities,query,bm25_scores=None,k=RERANK_TOP_K,strategy=FUSION_STRATEGY,weights=(DENSE_WEIGHT, LEXICAL_WEIGHT)) -> Tuple[List[str], List[str], List[float]]:
+    if not chunk_texts:
+        return [], [], []
+    n = min(len(chunk_texts), len(chunk_ids), len(similarities))
+    first_seen = {}
+    for i, cid in enumerate(chunk_ids[:n]):
+        first_seen.setdefault(cid, i)
+    keep = list(first_seen.values())
+    chunk_texts = [chunk_texts[i] for i in keep]
+    chunk_ids = [chunk_ids[i] for i in keep]
+    similarities = [similarities[i] for i in keep]
+
+    if bm25_scores is not None:
+        tokenized_chunks, query_tokens = None, None
+    else:
+        tokenized_chunks = await get_chunk_lemmas(chunk_ids, chunk_texts)
+        query_tokens = await get_english_lemmas(query or "")
 
-        bm25_scores = np.array(bm25.get_scores(query_tokens), dtype=float)
-        max_score = max(float(bm25_scores.max()), 1e-6)
-        bm25_scores = bm25_scores / max_score
+    def _rank(tokenized_chunks, query_tokens):
+        # Both vector stores return similarities (higher is better), including
+        # the cosine computed for lexical-only hits.
+        similarity_scores = np.asarray(similarities, dtype=np.float32)
 
-        similarity_scores = 1 - np.array(distances, dtype=float)
-        hybrid_scores = 0.7 * similarity_scores + 0.3 * bm25_scores
+        if bm25_scores is not None:
+            lexical_scores = np.asarray([bm25_scores[i] for i in keep], dtype=np.float32)
+        else:
+            if not any(tokenized_chunks):
+                top = top_k_indices(similarity_scores, k)
+                return [chunk_texts[i] for i in top], [chunk_ids[i] for i in top], similarity_scores[top].tolist()
 
-        results = np.array([
-            (text, cid, float(score))
-            for text, cid, score in zip(chunk_texts, chunk_ids, hybrid_scores)
-        ], dtype=object)
+            bm25 = BM25Okapi(tokenized_chunks)
+            lexical_scores = np.asarray(bm25.get_scores(query_tokens), dtype=np.float32)
 
-        _, unique_indices = np.unique(results[:, 1], return_index=True)
-        results = results[sorted(unique_indices)]
-        results = results[np.argsort(results[:, 2])[::-1]]
-        results = results[:5]
+        top, scores = rank_candidates(similarity_scores, lexical_scores, k=k, strategy=strategy, weights=weights)
 
-        ranked_chunks = [r[0] for r in results]
-        ranked_ids = [r[1] for r in results]
-        ranked_scores = [float(r[2]) for r in results]
+        ranked_chunks = [chunk_texts[i] for i in top]
+        ranked_ids = [chunk_ids[i] for i in top]
+        ranked_scores = scores.tolist()
         return ranked_chunks, ranked_ids, ranked_scores
 
     return await asyncio.to_thread(_rank, tokenized_chunks, query_tokens)
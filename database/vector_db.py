@@ -9,135 +9,206 @@ load_dotenv(PROJECT_ROOT / ".env")
 from typing import List, Dict, Any
 import asyncio
 import logging
-from pinecone import Pinecone, PineconeException
-import math
-from database.utils import get_top_chunks_with_bm25
+import json
+import time
+import random
+import numpy as np
+from database.utils import get_top_chunks_with_bm25, get_english_lemmas
+from database.bm25_index import load_bm25_index
+from database.vector_store import VectorStore
+from src.metrics import increment, observe
 logger = logging.getLogger(__name__)
 
 
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-index_name = "index"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
 
-if not pinecone_api_key:
-    raise RuntimeError("PINECONE_API_KEY not found — check your .env file")
+_store = None
 
-_pc = None
-_index = None
-_index_lock = asyncio.Lock()
 
-async def get_pinecone_client():
-    global _pc
-    if _pc is None:
-        _pc = Pinecone(api_key=pinecone_api_key)
-    return _pc
-
-async def get_index():
-    global _index
-    async with _index_lock:
-        if _index is None:
-            pc = await get_pinecone_client()
-            index_info = await asyncio.to_thread(pc.describe_index, index_name)
-            _index = pc.Index(host=index_info["host"], name=index_name)
-    return _index
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        if VECTOR_STORE == "pinecone":
+            from database.pinecone_store import PineconeVectorStore
+            _store = PineconeVectorStore()
+        elif VECTOR_STORE == "local":
+            from database.local_store import LocalVectorStore
+            _store = LocalVectorStore()
+        else:
+            raise RuntimeError(f"Unknown VECTOR_STORE backend: {VECTOR_STORE}")
+    return _store
 
 
 BATCH_SIZE = 100
-
-
-async def upsert_document_vectors(namespace: str, document_id: str, vectors: List[List[float]], chunks: List[Dict[str, Any]]):
+MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(1536 * 1024)))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "3"))
+UPSERT_BACKOFF_SECONDS = 0.5
+TOP_K_PER_DOC = 5
+
+
+def chunk_vector_id(document_id: str, page: int, chunk_index: int) -> str:
+    return f"{document_id}#p{page}c{chunk_index}"
+
+
+def split_batches(vectors_to_upsert: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    batches = []
+    batch, batch_bytes = [], 0
+    for record in vectors_to_upsert:
+        record_bytes = len(json.dumps(record))
+        if batch and (len(batch) >= BATCH_SIZE or batch_bytes + record_bytes > MAX_BATCH_BYTES):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += record_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _upsert_batch(store: VectorStore, semaphore: asyncio.Semaphore, namespace: str, batch_num: int, batch: List[Dict[str, Any]]):
+    # Vector ids are deterministic, so re-sending a batch after a failure
+    # overwrites the same vectors rather than duplicating them.
+    async with semaphore:
+        for attempt in range(UPSERT_MAX_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                await store.upsert(namespace=namespace, vectors=batch)
+                latency_ms = (time.perf_counter() - started) * 1000
+                observe("upsert.batch_latency_ms", latency_ms)
+                return {"batch": batch_num, "vectors": len(batch), "attempts": attempt + 1, "latency_ms": latency_ms}
+            except Exception as e:
+                if attempt == UPSERT_MAX_RETRIES:
+                    increment("upsert.failed_batches")
+                    logger.error(f"Upsert batch {batch_num} failed after {attempt + 1} attempts: {str(e)}")
+                    raise
+                increment("upsert.retries")
+                delay = UPSERT_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+                logger.warning(f"Upsert batch {batch_num} failed ({str(e)}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+async def upsert_document_vectors(namespace: str, document_id: str, vectors: List[List[float]], chunks: List[Dict[str, Any]], concurrency: int = UPSERT_CONCURRENCY, semaphore: asyncio.Semaphore | None = None):
+    """Upsert a document's chunk vectors in size-bounded batches.
+
+    Pass ``semaphore`` to share one in-flight limit across several calls.
+    """
     vectors_to_upsert = [
         {
-            "id": f"{document_id}#p{c['page']}c{c['chunk_index']}",
+            "id": chunk_vector_id(document_id, c["page"], c["chunk_index"]),
             "values": vector,
             "metadata": {
                 "document_id": document_id,
                 "page": c["page"],
                 "chunk_index": c["chunk_index"],
                 "chunk_text": c["text"],
+                "overlap_words": c.get("overlap_words", 0),
             },
         }
         for vector, c in zip(vectors, chunks)
     ]
 
-    index = await get_index()
-    results = []
-    total_batches = math.ceil(len(vectors_to_upsert) / BATCH_SIZE)
+    store = get_vector_store()
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+    batches = split_batches(vectors_to_upsert)
+    started = time.perf_counter()
 
-    try:
-        for batch_num in range(total_batches):
-            start = batch_num * BATCH_SIZE
-            end = start + BATCH_SIZE
-            batch = vectors_to_upsert[start:end]
-            result = await asyncio.to_thread(
-                index.upsert,
-                namespace=namespace,
-                vectors=batch
-            )
-            results.append(result)
-        return results
+    batch_reports = await asyncio.gather(
+        *[_upsert_batch(store, semaphore, namespace, batch_num, batch) for batch_num, batch in enumerate(batches)]
+    )
 
-    except Exception as e:
-        raise
+    elapsed = time.perf_counter() - started
+    increment("upsert.vectors", len(vectors_to_upsert))
+    return {
+        "vectors": len(vectors_to_upsert),
+        "batches": batch_reports,
+        "elapsed_s": elapsed,
+        "vectors_per_sec": len(vectors_to_upsert) / max(elapsed, 1e-6),
+    }
 
 
-async def _query_single_doc(index, user_id: str, vector, doc_id: str):
-    try:
-        return await asyncio.to_thread(
-            index.query,
-            namespace=user_id,
-            vector=vector,
-            top_k=5,
-            filter={"document_id": {"$eq": doc_id}},
-            include_metadata=True,
-            include_values=False
-        )
-    except PineconeException as e:
-        return None
-    except Exception as e:
+async def delete_document_vectors(namespace: str, document_id: str):
+    await get_vector_store().delete_document(namespace, document_id)
+
+
+def to_candidate(match_id: str, score: float, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": match_id,
+        "score": score,
+        "page": metadata.get("page"),
+        "chunk_index": metadata.get("chunk_index"),
+        "document_id": metadata.get("document_id"),
+        "chunk_text": metadata.get("chunk_text", ""),
+        "overlap_words": metadata.get("overlap_words", 0),
+    }
+
+
+def cosine_similarity(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return float(a @ b / max(float(np.linalg.norm(a) * np.linalg.norm(b)), 1e-12))
+
+
+async def add_lexical_candidates(store: VectorStore, user_id: str, vector, doc_ids: List[str], query: str, candidates: Dict[str, Dict[str, Any]], top_k: int):
+    """Score candidates against each document's ingest-time BM25 index.
+
+    Lexical top-k chunks that dense search missed are fetched and added to
+    ``candidates``.  Returns chunk id -> BM25 score, or None when a document
+    has no index (ingested before BM25 indexes existed) so the caller falls
+    back to scoring the dense candidates alone.
+    """
+    indexes = await asyncio.gather(*[load_bm25_index(user_id, doc_id) for doc_id in doc_ids])
+    if any(index is None for index in indexes):
         return None
 
+    query_tokens = await get_english_lemmas(query or "")
+    lexical_scores = {}
 
-async def query_vector_index(user_id: str, vector, doc_ids: List[str], query: str):
-    index = await get_index()
-    results = await asyncio.gather(
-        *[_query_single_doc(index, user_id, vector, doc_id) for doc_id in doc_ids],
-        return_exceptions=True
-    )
+    for doc_id, index in zip(doc_ids, indexes):
+        doc_scores = await asyncio.to_thread(index.scores, query_tokens)
+        for chunk_id, candidate in candidates.items():
+            if candidate["document_id"] == doc_id:
+                lexical_scores[chunk_id] = index.score_of(doc_scores, chunk_id)
 
-    all_matches = []
+        lexical_hits = index.top_k(doc_scores, top_k)
+        missing = [chunk_id for chunk_id, _ in lexical_hits if chunk_id not in candidates]
+        if missing:
+            for match in await store.fetch(user_id, doc_id, missing):
+                candidates[match["id"]] = to_candidate(match["id"], cosine_similarity(vector, match["values"]), match["metadata"])
+            increment("retrieval.lexical_only_hits", len(missing))
+        for chunk_id, score in lexical_hits:
+            lexical_scores[chunk_id] = score
 
-    for r in results:
-        if isinstance(r, Exception):
-            continue
+    return lexical_scores
 
-        if not r:
-            continue
 
-        if hasattr(r, "matches"):
-            all_matches.extend(r.matches)
-        elif isinstance(r, dict) and "matches" in r:
-            all_matches.extend(r["matches"])
+async def query_vector_index(user_id: str, vector, doc_ids: List[str], query: str, top_k: int = TOP_K_PER_DOC):
+    store = get_vector_store()
+    started = time.perf_counter()
+    try:
+        all_matches = await store.query_many(namespace=user_id, vector=vector, document_ids=doc_ids, top_k=top_k)
+    except Exception as e:
+        increment("retrieval.errors")
+        logger.error(f"Vector query failed for namespace {user_id}, documents {doc_ids}: {str(e)}")
+        raise
+    increment("retrieval.queries")
+    observe("retrieval.latency_ms", (time.perf_counter() - started) * 1000)
+    if not all_matches:
+        increment("retrieval.empty_results")
 
     candidates = {}
 
     for match in all_matches or []:
-            metadata = getattr(match, "metadata", {}) or {}
-            match_id = getattr(match, "id", "").strip()
-
-            candidates[match_id] = {
-                "id": match_id,
-                "score": getattr(match, "score", 0.0),
-                "page": metadata.get("page"),
-                "chunk_index": metadata.get("chunk_index"),
-                "document_id": metadata.get("document_id"),
-                "chunk_text": metadata.get("chunk_text", ""),
-            }
+            candidates[match["id"]] = to_candidate(match["id"], match["score"], match["metadata"])
+
+    lexical_scores = await add_lexical_candidates(store, user_id, vector, doc_ids, query, candidates, top_k)
 
     texts = [c["chunk_text"] for c in candidates.values()]
     ids = [c["id"] for c in candidates.values()]
-    distances = [c["score"] for c in candidates.values()]
+    similarities = [c["score"] for c in candidates.values()]
+    bm25_scores = [lexical_scores.get(i, 0.0) for i in ids] if lexical_scores is not None else None
 
-    top_chunks = await get_top_chunks_with_bm25(texts, ids, distances, query)
+    top_chunks = await get_top_chunks_with_bm25(texts, ids, similarities, query, bm25_scores=bm25_scores)
 
     if not top_chunks:
         return []
@@ -164,6 +235,7 @@ async def query_vector_index(user_id: str, vector, doc_ids: List[str], query: st
             "page": match["page"],
             "chunk_index": match["chunk_index"],
             "text": match["chunk_text"],
+            "overlap_words": match["overlap_words"],
             "document_id": match["document_id"],
             "id": match["id"],
             "vector_score": match["score"],
@@ -0,0 +1,34 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any
+
+
+class VectorStore(ABC):
+    """Backend used by database.vector_db to store and search chunk vectors.
+
+    Vectors are upserted as Pinecone-style records
+    ``{"id", "values", "metadata"}`` and matches come back as
+    ``{"id", "score", "metadata"}`` dicts, whatever the backend.
+    """
+
+    @abstractmethod
+    async def upsert(self, namespace: str, vectors: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    async def query(self, namespace: str, vector: List[float], document_id: str, top_k: int) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def fetch(self, namespace: str, document_id: str, ids: List[str]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def delete_document(self, namespace: str, document_id: str):
+        ...
+
+    async def query_many(self, namespace: str, vector: List[float], document_ids: List[str], top_k: int) -> List[Dict[str, Any]]:
+        results = await asyncio.gather(
+            *[self.query(namespace, vector, document_id, top_k) for document_id in document_ids]
+        )
+        return [match for matches in results for match in matches]
@@ -1,17 +1,86 @@
-from fastapi import FastAPI, UploadFile, Form,HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, Form,HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
 from pathlib import Path
-import shutil
+import os
 import io
+import json
+import uuid
+import asyncio
+import hashlib
+import logging
+from datetime import date
 
-from src.orchestrator import upload_file, extract_indicator
-from src.calulation import calculate_esrs_indicators,esrs_to_csv
-from src.llm_response import get_response
-from database.database import onboard_organization
+from src.orchestrator import ingest_document, extract_indicator, iter_indicator_results
+from src.calulation import calculate_esrs_indicators,esrs_to_csv, ready_esrs_indicators, save_esrs_metrics
+from src.llm_response import get_response, get_group_response
+from database.database import onboard_organization, ensure_schema, query_organization_metrics, query_indicator_metrics, query_metric_history
+from src.question_vectors import load_question_vectors
+from src.metrics import snapshot
+from src.text_extraction import shutdown_process_pools
+from src.embeddings import stop_embedding_dispatcher
+from src.portfolio import PortfolioRequest, run_portfolio
+from src.jobs import enqueue_job, enqueue_portfolio_job, get_job, get_job_csv, get_job_result, start_job_workers, stop_job_workers
 app = FastAPI()
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "true").lower() == "true"
+# Room for the multipart envelope and form fields around the file itself.
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+_persist_tasks = set()
+
+
+@app.on_event("startup")
+async def warm_question_vectors():
+    await load_question_vectors()
+
+
+@app.on_event("startup")
+async def migrate_metrics_schema():
+    try:
+        await ensure_schema()
+    except Exception as e:
+        logger.error(f"Could not apply metrics schema: {str(e)}")
+
+
+@app.on_event("startup")
+async def start_extraction_workers():
+    await start_job_workers(run_job)
+
+
+@app.on_event("shutdown")
+async def stop_pdf_workers():
+    shutdown_process_pools()
+
+
+@app.on_event("shutdown")
+async def stop_extraction_workers():
+    await stop_job_workers()
+
+
+@app.on_event("shutdown")
+async def stop_embedding_batcher():
+    await stop_embedding_dispatcher()
+
+
+@app.on_event("shutdown")
+async def flush_persisted_uploads():
+    if _persist_tasks:
+        await asyncio.gather(*_persist_tasks, return_exceptions=True)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse on the declared size before the multipart body is received.
+    content_length = request.headers.get("content-length")
+    if request.url.path == "/upload" and content_length and content_length.isdigit():
+        if int(content_length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=413, content={"detail": "Upload exceeds MAX_UPLOAD_BYTES"})
+    return await call_next(request)
 
 
 @app.post("/organizations_onboard")
@@ -32,39 +101,218 @@ async def onboard_organization(
         "organization_id": organization_id
     }
 
+def persist_upload(data: bytes, save_path: Path):
+    if save_path.exists():
+        return
+    part_path = UPLOAD_DIR / f"{uuid.uuid4().hex}.part"
+    try:
+        part_path.write_bytes(data)
+        os.replace(part_path, save_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+
+
+def schedule_persist(data: bytes, save_path: Path):
+    task = asyncio.create_task(asyncio.to_thread(persist_upload, data, save_path))
+    _persist_tasks.add(task)
+    task.add_done_callback(_persist_tasks.discard)
+
+
 @app.post("/upload")
 async def upload_pdf(file: UploadFile, user_id: str = Form(...)):
-    save_path = UPLOAD_DIR / file.filename
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload exceeds MAX_UPLOAD_BYTES")
 
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if len(buffer) + len(chunk) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Upload exceeds MAX_UPLOAD_BYTES")
+        digest.update(chunk)
+        buffer += chunk
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
 
-    doc_id, _ = await upload_file(save_path, user_id)
+    data = bytes(buffer)
+    del buffer
+    doc_id = digest.hexdigest()
+
+    save_path = None
+    if PERSIST_UPLOADS:
+        save_path = UPLOAD_DIR / f"{doc_id}.pdf"
+        schedule_persist(data, save_path)
+
+    doc_id, _, ingested = await ingest_document(
+        data, user_id, doc_id,
+        filename=file.filename,
+        path=str(save_path) if save_path else None
+    )
 
     return {
-        "status": "upload_complete",
+        "status": "upload_complete" if ingested else "already_indexed",
         "doc_id": doc_id
     }
 
 
+async def run_extraction_job(job):
+    results = await extract_indicator(
+        user_id=job["user_id"],
+        doc_ids=[job["doc_id"]],
+        get_response=get_response,
+        get_group_response=get_group_response
+    )
+    raw_data = await calculate_esrs_indicators(results)
+    return await esrs_to_csv(raw_data, job["organization_id"], job["reporting_year"])
+
+
+async def run_portfolio_job(job):
+    request = PortfolioRequest.model_validate_json(job["payload"])
+    result = await run_portfolio(request.items, get_response, get_group_response)
+    return json.dumps(result, default=str).encode("utf-8")
+
+
+async def run_job(job):
+    if job["kind"] == "portfolio":
+        return await run_portfolio_job(job)
+    return await run_extraction_job(job)
+
+
 @app.post("/extract")
 async def extract_indicators(
     user_id: str = Form(...),
     doc_id: str = Form(...),
     organization_id: str = Form(...),
+    reporting_year: int = Form(None),
+    refresh: bool = Form(False),
 ):
-    results = await extract_indicator(
-        user_id=user_id,
-        doc_ids=[doc_id],
-        get_response=get_response
+    job, created = await enqueue_job(user_id, doc_id, organization_id, reporting_year=reporting_year or date.today().year, refresh=refresh)
+
+    return {
+        "status": job["status"],
+        "job_id": job["id"],
+        "deduplicated": not created
+    }
+
+
+def format_event(event: str, payload, stream_format: str) -> str:
+    if stream_format == "ndjson":
+        return json.dumps({"event": event, **payload}, default=str) + "\n"
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@app.post("/extract/stream")
+async def stream_indicators(
+    user_id: str = Form(...),
+    doc_id: str = Form(...),
+    organization_id: str = Form(...),
+    reporting_year: int = Form(None),
+    stream_format: str = Form("sse"),
+):
+    if stream_format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="stream_format must be 'sse' or 'ndjson'")
+
+    async def events():
+        results = {}
+        esrs = {}
+        async for key, result in iter_indicator_results(
+            user_id=user_id,
+            doc_ids=[doc_id],
+            get_response=get_response,
+            get_group_response=get_group_response
+        ):
+            results[key] = result
+            yield format_event("indicator", {"indicator_code": key, **result}, stream_format)
+
+            ready = await ready_esrs_indicators(results, esrs)
+            esrs.update(ready)
+            for esrs_key, item in ready.items():
+                yield format_event("esrs", {"indicator_code": esrs_key, **item}, stream_format)
+
+        await save_esrs_metrics(esrs, organization_id, reporting_year)
+        yield format_event("done", {"indicators": len(results), "esrs_indicators": len(esrs)}, stream_format)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if stream_format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
     )
-    print(results)
-    raw_data= await calculate_esrs_indicators(results)
 
-    csv_bytes =  esrs_to_csv(raw_data,organization_id)
-    csv_stream = io.BytesIO(csv_bytes)
+
+@app.post("/portfolio/extract")
+async def extract_portfolio(request: PortfolioRequest, refresh: bool = False):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Manifest has no items")
+    job, created = await enqueue_portfolio_job(request.model_dump_json(), refresh=refresh)
+
+    return {
+        "status": job["status"],
+        "job_id": job["id"],
+        "deduplicated": not created
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_extraction_job(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/csv")
+async def get_extraction_job_csv(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["kind"] != "extract":
+        raise HTTPException(status_code=404, detail="Job has no CSV; use /jobs/{job_id}/result")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    csv_bytes = await get_job_csv(job_id)
     return StreamingResponse(
-        csv_stream,
+        io.BytesIO(csv_bytes),
         media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={doc_id}_indicators.csv"}
+        headers={"Content-Disposition": f"attachment; filename={job['doc_id']}_indicators.csv"}
     )
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_portfolio_job_result(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["kind"] != "portfolio":
+        raise HTTPException(status_code=404, detail="Job has no JSON result; use /jobs/{job_id}/csv")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    return JSONResponse(content=json.loads(await get_job_result(job_id)))
+
+
+async def metric_page(query, *args, **kwargs):
+    try:
+        items, next_cursor = await query(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/organizations/{organization_id}/esg_metrics")
+async def get_organization_metrics(organization_id: int, cursor: str = None, limit: int = None):
+    return await metric_page(query_organization_metrics, organization_id, cursor=cursor, limit=limit)
+
+
+@app.get("/organizations/{organization_id}/esg_metrics/history")
+async def get_organization_metric_history(organization_id: int, indicator_name: str = None, cursor: str = None, limit: int = None):
+    return await metric_page(query_metric_history, organization_id, indicator_name=indicator_name, cursor=cursor, limit=limit)
+
+
+@app.get("/esg_metrics")
+async def get_indicator_metrics(indicator_name: str, cursor: str = None, limit: int = None):
+    return await metric_page(query_indicator_metrics, indicator_name, cursor=cursor, limit=limit)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return snapshot()
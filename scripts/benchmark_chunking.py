@@ -0,0 +1,60 @@
+"""Report chunking throughput (pages/sec) on synthetic report pages.
+
+    python scripts/benchmark_chunking.py --pages 2000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.chunking import chunk_blocks, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+
+WORDS = (
+    "emissions scope energy consumption renewable workforce employees revenue board "
+    "suppliers payment gender pay gap water waste reporting year total tCO2e MWh percent"
+).split()
+
+
+def synthetic_page(rng: random.Random) -> list[tuple]:
+    """Blocks like ``page.get_text("blocks")``: headings, paragraphs and a table."""
+    blocks, y = [], 40.0
+    for section in range(rng.randint(1, 3)):
+        blocks.append((50, y, 300, y + 12, f"Section {section + 1} {rng.choice(WORDS).title()}"))
+        y += 20
+        for _ in range(rng.randint(2, 5)):
+            words = rng.randint(20, 220)
+            blocks.append((50, y, 550, y + 40, " ".join(rng.choice(WORDS) for _ in range(words)) + "."))
+            y += 50
+    if rng.random() < 0.5:
+        for row in range(rng.randint(3, 25)):
+            for col in range(4):
+                cell = rng.choice(WORDS) if col == 0 else str(rng.randint(0, 99999))
+                blocks.append((50 + col * 120, y, 160 + col * 120, y + 8, cell))
+            y += 10
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    pages = [synthetic_page(rng) for _ in range(args.pages)]
+
+    best, chunks = float("inf"), 0
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        chunks = sum(len(chunk_blocks(blocks, args.max_tokens, args.overlap_tokens)) for blocks in pages)
+        best = min(best, time.perf_counter() - started)
+    print(f"{args.pages} pages -> {chunks} chunks: {args.pages / best:.0f} pages/sec, {chunks / best:.0f} chunks/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Report embedding throughput (chunks/sec) for each embedding backend.
+
+    python scripts/benchmark_embeddings.py --backends torch onnx int8 --chunks 2000
+    python scripts/benchmark_embeddings.py --pdf report.pdf
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.embeddings import load_model, EMBEDDING_BATCH_SIZE
+
+WORDS = (
+    "emissions scope energy consumption renewable workforce employees revenue board "
+    "suppliers payment gender pay gap water waste reporting year total tCO2e MWh percent"
+).split()
+
+
+def synthetic_chunks(count: int, words_per_chunk: int = 250, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_chunk)) for _ in range(count)]
+
+
+async def pdf_chunks(path: Path) -> list[str]:
+    from src.text_extraction import iter_pdf_chunks
+    return [record["text"] async for record in iter_pdf_chunks(path)]
+
+
+def benchmark(backend: str, chunks: list[str], batch_size: int, repeats: int) -> float:
+    model = load_model(backend)
+    model.encode(chunks[:batch_size], batch_size=batch_size, convert_to_numpy=True)
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.encode(chunks, batch_size=batch_size, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - started)
+    return len(chunks) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "int8"])
+    parser.add_argument("--chunks", type=int, default=1000, help="synthetic chunks to embed")
+    parser.add_argument("--pdf", type=Path, help="embed the chunks of this PDF instead")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    chunks = asyncio.run(pdf_chunks(args.pdf)) if args.pdf else synthetic_chunks(args.chunks)
+    print(f"{len(chunks)} chunks, batch size {args.batch_size}")
+    for backend in args.backends:
+        try:
+            rate = benchmark(backend, chunks, args.batch_size, args.repeats)
+        except Exception as e:
+            print(f"{backend:>6}: unavailable ({e})")
+            continue
+        print(f"{backend:>6}: {rate:8.1f} chunks/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Report PDF page-reading throughput (pages/sec) as PDF workers are added.
+
+    python scripts/benchmark_pdf_pages.py --pdf report.pdf --workers 1 2 4 8
+    python scripts/benchmark_pdf_pages.py --pages 400 --in-memory
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitz
+from src.text_extraction import iter_pdf_pages, shutdown_process_pools
+
+WORDS = (
+    "emissions scope energy consumption renewable workforce employees revenue board "
+    "suppliers payment gender pay gap water waste reporting year total tCO2e MWh percent"
+).split()
+
+
+def default_workers() -> list[int]:
+    counts, workers = [], 1
+    while workers <= (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts
+
+
+def synthetic_pdf(pages: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    with fitz.open() as doc:
+        for page_num in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Section {page_num + 1}", fontsize=14)
+            for line in range(45):
+                text = " ".join(rng.choice(WORDS) for _ in range(12))
+                page.insert_text((72, 100 + line * 15), text, fontsize=9)
+        return doc.tobytes()
+
+
+async def read_all(source, workers: int) -> int:
+    pages = 0
+    async for _ in iter_pdf_pages(source, workers):
+        pages += 1
+    return pages
+
+
+def benchmark(source, workers: int, repeats: int) -> tuple[int, float]:
+    # The first pass starts the worker processes; time the runs after it.
+    pages = asyncio.run(read_all(source, workers))
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        asyncio.run(read_all(source, workers))
+        best = min(best, time.perf_counter() - started)
+    return pages, pages / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", type=Path, help="PDF to read (default: a generated report)")
+    parser.add_argument("--pages", type=int, default=200, help="pages of the generated report")
+    parser.add_argument("--workers", nargs="+", type=int, default=default_workers())
+    parser.add_argument("--in-memory", action="store_true", help="read from bytes, as uploads are")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        source = args.pdf.read_bytes() if args.in_memory else args.pdf
+    else:
+        data = synthetic_pdf(args.pages)
+        source = data
+        if not args.in_memory:
+            path = Path(f"benchmark_{args.pages}_pages.pdf")
+            path.write_bytes(data)
+            source = path
+
+    baseline = None
+    try:
+        for workers in args.workers:
+            pages, rate = benchmark(source, workers, args.repeats)
+            baseline = baseline or rate
+            print(f"{workers:>3} worker(s): {rate:8.1f} pages/sec ({rate / baseline:.1f}x, {pages} pages)")
+    finally:
+        shutdown_process_pools()
+        if not args.pdf and not args.in_memory:
+            source.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare rank_candidates with the pre-vectorisation hybrid ranking.
+
+    python scripts/benchmark_ranking.py --candidates 5 100 1000
+"""
+import sys
+import timeit
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.ranking import rank_candidates
+
+
+def legacy_rank(chunk_texts, chunk_ids, similarities, raw_scores, k):
+    # The object-array ranking get_top_chunks_with_bm25 used before database.ranking.
+    lexical_scores = np.array(raw_scores, dtype=float)
+    lexical_scores = lexical_scores / max(float(lexical_scores.max()), 1e-6)
+    hybrid_scores = 0.7 * np.array(similarities, dtype=float) + 0.3 * lexical_scores
+
+    results = np.array([
+        (text, cid, float(score))
+        for text, cid, score in zip(chunk_texts, chunk_ids, hybrid_scores)
+    ], dtype=object)
+
+    _, unique_indices = np.unique(results[:, 1], return_index=True)
+    results = results[sorted(unique_indices)]
+    results = results[np.argsort(results[:, 2])[::-1]]
+    results = results[:k]
+    return [r[0] for r in results], [r[1] for r in results], [float(r[2]) for r in results]
+
+
+def candidates(count: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    ids = [f"doc#p{i // 4}c{i % 4}" for i in range(count)]
+    texts = [f"chunk {i}" for i in range(count)]
+    similarities = rng.uniform(0.2, 0.9, count).tolist()
+    lexical = np.where(rng.random(count) < 0.3, rng.gamma(2.0, 2.0, count), 0.0).tolist()
+    return texts, ids, similarities, lexical
+
+
+def best_of(fn, repeats: int, number: int) -> float:
+    return min(timeit.repeat(fn, repeat=repeats, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", nargs="+", type=int, default=[5, 100, 1000])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200, help="calls per timing repeat")
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'legacy us':>10} {'vectorised us':>14} {'speedup':>8}")
+    for count in args.candidates:
+        texts, ids, similarities, lexical = candidates(count)
+
+        _, legacy_ids, _ = legacy_rank(texts, ids, similarities, lexical, args.top_k)
+        top, _ = rank_candidates(similarities, lexical, k=args.top_k, strategy="linear", weights=(0.7, 0.3))
+        if [ids[i] for i in top] != legacy_ids:
+            raise SystemExit(f"rankings differ at {count} candidates")
+
+        legacy = best_of(lambda: legacy_rank(texts, ids, similarities, lexical, args.top_k), args.repeats, args.number)
+        vectorised = best_of(lambda: rank_candidates(similarities, lexical, k=args.top_k, strategy="linear", weights=(0.7, 0.3)), args.repeats, args.number)
+        print(f"{count:>10} {legacy * 1e6:>10.1f} {vectorised * 1e6:>14.1f} {legacy / vectorised:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
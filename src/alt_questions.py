@@ -0,0 +1,98 @@
+import os
+import asyncio
+import logging
+from src.metrics import increment
+
+logger = logging.getLogger(__name__)
+
+ALT_QUESTION_STRATEGY = os.getenv("ALT_QUESTION_STRATEGY", "sequential")
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "3"))
+
+
+def is_confident(response):
+    return response is not None and response.value is not None and (response.confidence or 0) >= 0.6
+
+
+def question_label(index):
+    if index is None:
+        return "none"
+    return "primary" if index == 0 else f"alt{index}"
+
+
+def settle(responses, errors):
+    # Nothing was confident: prefer the earliest phrasing that answered at all.
+    if not responses and errors:
+        raise errors[0]
+    return None, responses[min(responses)] if responses else None
+
+
+async def ask_first_confident(calls, strategy: str = ALT_QUESTION_STRATEGY, hedge_delay: float = HEDGE_DELAY_SECONDS):
+    """Run question calls (in preference order) until one answers confidently.
+
+    Returns ``(winner_index, response)``; when nothing is confident the
+    winner is None and the earliest phrasing that answered is returned. A
+    call that raises counts as not confident; the error is only re-raised
+    when every call failed.
+    """
+    responses = {}
+    errors = []
+
+    if strategy == "sequential":
+        for i, call in enumerate(calls):
+            increment("llm.question_calls")
+            try:
+                responses[i] = await call()
+            except Exception as e:
+                logger.warning(f"Question {question_label(i)} failed: {str(e)}")
+                errors.append(e)
+                continue
+            if is_confident(responses[i]):
+                return i, responses[i]
+        return settle(responses, errors)
+
+    if strategy not in ("parallel", "hedged"):
+        raise ValueError(f"Unknown alt question strategy: {strategy}")
+
+    tasks = {}
+    launched = 0
+
+    def launch():
+        nonlocal launched
+        tasks[asyncio.create_task(calls[launched]())] = launched
+        launched += 1
+        increment("llm.question_calls")
+
+    try:
+        if calls:
+            launch()
+        while strategy == "parallel" and launched < len(calls):
+            launch()
+
+        while tasks:
+            timeout = hedge_delay if strategy == "hedged" and launched < len(calls) else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                increment("llm.hedged_launches")
+                launch()
+                continue
+
+            for task in sorted(done, key=tasks.get):
+                i = tasks.pop(task)
+                try:
+                    responses[i] = task.result()
+                except Exception as e:
+                    logger.warning(f"Question {question_label(i)} failed: {str(e)}")
+                    errors.append(e)
+                else:
+                    if is_confident(responses[i]):
+                        return i, responses[i]
+                # A failed or unconfident answer hands over to the next phrasing now.
+                if strategy == "hedged" and launched < len(calls):
+                    launch()
+
+        return settle(responses, errors)
+    finally:
+        if tasks:
+            increment("llm.cancelled_question_calls", len(tasks))
+        for task in tasks:
+            task.cancel()
@@ -13,6 +13,56 @@ async def safe_divide(numerator, denominator):
         return None
     return numerator / denominator
 
+ESRS_ORDER = [
+    "Report_Year",
+    "Scope1_Emissions",
+    "Scope2_Emissions",
+    "Scope3_Emissions",
+    "GHG_Emissions_Intensity",
+    "Total_Energy",
+    "Renewable_Energy_Percentage",
+    "NetZero_Target_Year",
+    "Green_Financing_Volume",
+    "Total_Employees",
+    "Female_Employees_Percentage",
+    "Gender_Pay_Gap",
+    "Training_Hours_Per_Employee",
+    "Employee_Turnover_Rate",
+    "Work_Accidents",
+    "Employees_CBA_Covered",
+    "Board_Female_Representation",
+    "Board_Meetings",
+    "Corruption_Incidents",
+    "Avg_Payment_Period_To_Suppliers",
+    "Suppliers_Screened_ESG_Percentage",
+]
+
+EMPTY_ITEM = {"value": None, "unit": None, "page": None, "confidence": None, "source_section": None, "notes": None}
+
+# Extracted indicators each ESRS output row is computed from.
+ESRS_DEPENDENCIES = {
+    "Scope1_Emissions": ["Scope1_Emissions"],
+    "Scope2_Emissions": ["Scope2_Emissions"],
+    "Scope3_Emissions": ["Scope3_Emissions"],
+    "GHG_Emissions_Intensity": ["Scope1_Emissions", "Scope2_Emissions", "Scope3_Emissions", "Revenue_EUR"],
+    "Total_Energy": ["Total_Energy"],
+    "Renewable_Energy_Percentage": ["Renewable_Energy", "Total_Energy"],
+    "NetZero_Target_Year": ["NetZero_Target_Year"],
+    "Green_Financing_Volume": ["Green_Financing_Volume"],
+    "Total_Employees": ["Total_Employees"],
+    "Female_Employees_Percentage": ["Female_Employees", "Total_Employees"],
+    "Gender_Pay_Gap": ["Avg_Salary_Male", "Avg_Salary_Female"],
+    "Training_Hours_Per_Employee": ["Total_Training_Hours", "Total_Employees"],
+    "Employee_Turnover_Rate": ["Employees_Left", "Average_Employees"],
+    "Work_Accidents": ["Work_Accidents"],
+    "Employees_CBA_Covered": ["Employees_CBA_Covered", "Total_Employees"],
+    "Board_Female_Representation": ["Female_Board_Members", "Total_Board_Members"],
+    "Board_Meetings": ["Board_Meetings"],
+    "Corruption_Incidents": ["Corruption_Incidents"],
+    "Avg_Payment_Period_To_Suppliers": ["Trade_Payables", "Purchases_From_Suppliers"],
+    "Suppliers_Screened_ESG_Percentage": ["Suppliers_Screened_ESG", "Total_Suppliers"],
+}
+
 async def calculate_esrs_indicators(data):
     def get_item(key):
         item = data.get(key)
@@ -104,35 +154,42 @@ async def calculate_esrs_indicators(data):
     return esrs
 
 
-
-async def esrs_to_csv(esrs_dict, organization_id):
-
-    ESRS_ORDER = [
-        "Report_Year",
-        "Scope1_Emissions",
-        "Scope2_Emissions",
-        "Scope3_Emissions",
-        "GHG_Emissions_Intensity",
-        "Total_Energy",
-        "Renewable_Energy_Percentage",
-        "NetZero_Target_Year",
-        "Green_Financing_Volume",
-        "Total_Employees",
-        "Female_Employees_Percentage",
-        "Gender_Pay_Gap",
-        "Training_Hours_Per_Employee",
-        "Employee_Turnover_Rate",
-        "Work_Accidents",
-        "Employees_CBA_Covered",
-        "Board_Female_Representation",
-        "Board_Meetings",
-        "Corruption_Incidents",
-        "Avg_Payment_Period_To_Suppliers",
-        "Suppliers_Screened_ESG_Percentage",
+async def ready_esrs_indicators(data, emitted):
+    ready = [
+        key for key, inputs in ESRS_DEPENDENCIES.items()
+        if key not in emitted and all(i in data for i in inputs)
     ]
+    if not ready:
+        return {}
+    all_inputs = {i for inputs in ESRS_DEPENDENCIES.values() for i in inputs}
+    esrs = await calculate_esrs_indicators({**{i: EMPTY_ITEM for i in all_inputs}, **data})
+    return {key: esrs[key] for key in ready}
 
-    rows = []
+
+def esrs_to_bulk(esrs_dict):
     esg_bulk = {"ESRS": {}}
+    for key in ESRS_ORDER:
+        item = esrs_dict.get(key, {})
+        esg_bulk["ESRS"][item.get("indicator_name")] = {
+            "value": item.get("value"),
+            "unit": item.get("unit")
+        }
+    return esg_bulk
+
+
+async def save_esrs_metrics(esrs_dict, organization_id, reporting_year=None, buffer=None):
+    if buffer is not None:
+        await buffer.add(organization_id, esrs_to_bulk(esrs_dict), reporting_year)
+        return
+    await insert_esg_metrics_async(
+        organization_id=organization_id,
+        esg_data=esrs_to_bulk(esrs_dict),
+        reporting_year=reporting_year
+    )
+
+
+async def esrs_to_csv(esrs_dict, organization_id, reporting_year=None):
+    rows = []
 
     for key in ESRS_ORDER:
         item = esrs_dict.get(key, {})
@@ -148,15 +205,7 @@ async def esrs_to_csv(esrs_dict, organization_id):
             "notes": item.get("notes"),
         })
 
-        esg_bulk["ESRS"][item.get("indicator_name")] = {
-            "value": item.get("value"),
-            "unit": item.get("unit")
-        }
-
-    await insert_esg_metrics_async(
-        organization_id=organization_id,
-        esg_data=esg_bulk
-    )
+    await save_esrs_metrics(esrs_dict, organization_id, reporting_year)
 
     df = pd.DataFrame(rows)
     buf = io.BytesIO()
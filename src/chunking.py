@@ -0,0 +1,175 @@
+import os
+import re
+from src.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Bump when a code change moves chunk boundaries; documents are re-indexed.
+CHUNKER_VERSION = 3
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "350"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "70"))
+# Tables are kept whole up to this multiple of CHUNK_TOKENS before they are
+# split between rows.
+TABLE_TOKEN_FACTOR = 2
+
+ROW_TOLERANCE = 3.0
+MAX_CELL_WORDS = 12
+MAX_HEADING_WORDS = 12
+
+_digits = re.compile(r"\d")
+
+
+def is_heading(text: str) -> bool:
+    if "\n" in text:
+        return False
+    words = text.split()
+    if not words or len(words) > MAX_HEADING_WORDS:
+        return False
+    if text.endswith((".", ",", ";", ":")) or len(_digits.findall(text)) > len(text) // 3:
+        return False
+    return text[0].isupper() or text[0].isdigit()
+
+
+def layout_units(blocks) -> list[tuple[str, str]]:
+    """Turn ``page.get_text("blocks")`` tuples into ``(kind, text)`` units.
+
+    Blocks sharing a baseline are cells of one table row when they are all
+    short; consecutive rows form a single "table" unit so a table is never
+    split mid-row. Other blocks become "heading" or "text" units.
+    """
+    rows = []
+    for x0, y0, x1, y1, text in sorted(blocks, key=lambda b: (b[1], b[0])):
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if rows and abs(y0 - rows[-1][0]) <= ROW_TOLERANCE:
+            rows[-1][1].append((x0, text))
+        else:
+            rows.append((y0, [(x0, text)]))
+
+    units = []
+    for _, row_cells in rows:
+        cells = [text for _, text in sorted(row_cells)]
+        tabular = len(cells) > 1 and all(len(cell.split()) <= MAX_CELL_WORDS for cell in cells)
+        if tabular:
+            row = " | ".join(cells)
+            if units and units[-1][0] == "table":
+                units[-1] = ("table", units[-1][1] + "\n" + row)
+            else:
+                units.append(("table", row))
+            continue
+        for cell in cells:
+            units.append(("heading" if is_heading(cell) else "text", cell))
+    return units
+
+
+def take_words(text: str, max_tokens: int) -> tuple[str, str]:
+    # Leading words that fit in max_tokens (at least one, so callers progress), and the rest.
+    words = text.split()
+    budget = max_tokens * CHARS_PER_TOKEN
+    used = 0
+    for count, word in enumerate(words):
+        used += len(word) + 1
+        if count and used > budget:
+            return " ".join(words[:count]), " ".join(words[count:])
+    return text, ""
+
+
+def split_table(text: str, max_tokens: int) -> list[str]:
+    # Split between rows, repeating the first (header) row on every piece.
+    header, *rows = text.split("\n")
+    pieces, current = [], [header]
+    for row in rows:
+        if len(current) > 1 and estimate_tokens("\n".join(current + [row])) > max_tokens:
+            pieces.append("\n".join(current))
+            current = [header]
+        current.append(row)
+    pieces.append("\n".join(current))
+    return pieces
+
+
+def tail_words(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    budget = max_tokens * CHARS_PER_TOKEN
+    kept, used = [], 0
+    for word in reversed(text.split()):
+        if used + len(word) + 1 > budget:
+            break
+        kept.append(word)
+        used += len(word) + 1
+    return " ".join(reversed(kept))
+
+
+def chunk_blocks(blocks, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[tuple[str, int]]:
+    """Pack a page's layout units into ``(text, overlap_words)`` chunks of at most ``max_tokens``.
+
+    Units are never cut except when they cannot fit in a chunk whole; text
+    cut across chunks repeats its last ``overlap_tokens`` at the start of the
+    next one, and ``overlap_words`` counts those repeated leading words.
+    Headings open a new chunk. Output depends only on the page
+    content, so ``(page, chunk_index)`` ids are stable.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    # Sizes are kept in characters, "\n" separators included, so a chunk's
+    # estimate_tokens never exceeds max_tokens.
+    limit = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    parts, used, fresh = [], 0, False
+
+    def cost(text: str) -> int:
+        return len(text) + (1 if parts else 0)
+
+    def flush(carry_tokens: int = 0):
+        nonlocal parts, used, fresh
+        if fresh:
+            carried = len(parts[0][1].split()) if parts[0][0] == "overlap" else 0
+            chunks.append(("\n".join(text for _, text in parts), carried))
+        tail = tail_words(parts[-1][1], carry_tokens) if parts and parts[-1][0] == "text" else ""
+        parts = [("overlap", tail)] if tail else []
+        used = len(tail)
+        fresh = False
+
+    def add(kind: str, text: str, opens: bool = True):
+        nonlocal used, fresh
+        used += cost(text)
+        parts.append((kind, text))
+        fresh = fresh or opens
+
+    for kind, text in layout_units(blocks):
+        if kind == "heading":
+            if parts and parts[0][0] != "overlap" and used + cost(text) > limit:
+                # A run of headings (a table of contents) fills a chunk on its own.
+                fresh = True
+            if fresh or (parts and parts[0][0] == "overlap"):
+                flush()
+            add(kind, text, opens=False)
+            continue
+
+        if kind == "table":
+            table_limit = max_tokens * TABLE_TOKEN_FACTOR
+            for piece in [text] if estimate_tokens(text) <= table_limit else split_table(text, max_tokens):
+                if fresh and used + cost(piece) > limit:
+                    flush()
+                add(kind, piece)
+            continue
+
+        while text:
+            if used + cost(text) <= limit:
+                add(kind, text)
+                break
+            if fresh and len(text) <= limit:
+                # Fits whole in the next chunk; carry what context there is room for.
+                flush(min(overlap_tokens, (limit - len(text) - 1) // CHARS_PER_TOKEN))
+                continue
+            room = limit - used - (1 if parts else 0)
+            if fresh and room < overlap_tokens * CHARS_PER_TOKEN:
+                flush(overlap_tokens)
+                continue
+            head, text = take_words(text, room // CHARS_PER_TOKEN)
+            add(kind, head)
+            if text:
+                flush(overlap_tokens)
+
+    # A heading that closes the page still identifies the section.
+    fresh = fresh or any(kind == "heading" for kind, _ in parts)
+    flush()
+    return chunks
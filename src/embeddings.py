@@ -1,13 +1,185 @@
+import os
 import asyncio
+import logging
+from collections import deque
 from sentence_transformers import SentenceTransformer
+from src.metrics import increment, observe
+
+logger = logging.getLogger(__name__)
 
 # Use the all-MiniLM-L6-v2 model
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# torch (full precision), onnx (ONNX Runtime, needs `optimum[onnxruntime]`) or int8 (dynamic quantization)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "0"))
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "256"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+QUERY_PRIORITY = 0
+INGEST_PRIORITY = 1
+
+
+def embedding_model_id() -> str:
+    """Identify the vectors a backend produces, for keying caches.
+
+    The default torch backend keeps the bare model name so existing caches stay valid.
+    """
+    model_id = MODEL_NAME
+    if EMBEDDING_BACKEND != "torch":
+        model_id += f"-{EMBEDDING_BACKEND}"
+        if EMBEDDING_BACKEND == "onnx" and EMBEDDING_ONNX_FILE:
+            model_id += f"-{os.path.splitext(os.path.basename(EMBEDDING_ONNX_FILE))[0]}"
+    if EMBEDDING_MAX_SEQ_LENGTH:
+        model_id += f"-seq{EMBEDDING_MAX_SEQ_LENGTH}"
+    return model_id
+
+
+def load_model(backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    if EMBEDDING_THREADS > 0:
+        import torch
+        torch.set_num_threads(EMBEDDING_THREADS)
 
-async def embed_sentences(sentences):
-    embeddings = await asyncio.to_thread(
-        model.encode,
-        sentences,
-        convert_to_numpy=True
+    if backend == "torch":
+        loaded = SentenceTransformer(MODEL_NAME)
+    elif backend == "onnx":
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if EMBEDDING_ONNX_FILE:
+            model_kwargs["file_name"] = EMBEDDING_ONNX_FILE
+        if EMBEDDING_THREADS > 0:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = EMBEDDING_THREADS
+            model_kwargs["session_options"] = session_options
+        loaded = SentenceTransformer(MODEL_NAME, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    elif backend == "int8":
+        import torch
+        loaded = SentenceTransformer(MODEL_NAME, device="cpu")
+        loaded = torch.quantization.quantize_dynamic(loaded, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+    if EMBEDDING_MAX_SEQ_LENGTH:
+        loaded.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+    logger.info(
+        f"Loaded {MODEL_NAME} with {backend} backend "
+        f"(batch_size={EMBEDDING_BATCH_SIZE}, max_seq_length={loaded.max_seq_length})"
     )
+    return loaded
+
+
+EMBEDDING_MODEL_ID = embedding_model_id()
+model = load_model()
+
+
+def encode(sentences):
+    return model.encode(sentences, batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+
+
+class EmbeddingDispatcher:
+    """Coalesce concurrent embedding requests into shared ``encode`` calls.
+
+    Requests wait up to ``wait_seconds`` for company, then are packed whole
+    into batches of at most ``max_batch`` sentences, query requests first so
+    a bulk ingest never holds a search behind it for more than one batch.
+    """
+
+    def __init__(self, encode_fn, max_batch: int = EMBEDDING_MAX_BATCH, wait_seconds: float = EMBEDDING_BATCH_WAIT_MS / 1000):
+        self.encode = encode_fn
+        self.max_batch = max_batch
+        self.wait_seconds = wait_seconds
+        self.loop = asyncio.get_running_loop()
+        self._queues = {QUERY_PRIORITY: deque(), INGEST_PRIORITY: deque()}
+        self._pending = asyncio.Event()
+        self._worker = None
+
+    async def submit(self, sentences: list[str], priority: int = INGEST_PRIORITY):
+        future = self.loop.create_future()
+        self._queues[priority].append((sentences, future))
+        self._pending.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return await future
+
+    def _queued(self) -> int:
+        return sum(len(sentences) for queue in self._queues.values() for sentences, _ in queue)
+
+    def _take_batch(self):
+        batch, size = [], 0
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue and (not batch or size + len(queue[0][0]) <= self.max_batch):
+                sentences, future = queue.popleft()
+                if future.done():
+                    continue
+                batch.append((sentences, future))
+                size += len(sentences)
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            if self.wait_seconds > 0 and self._queued() < self.max_batch:
+                await asyncio.sleep(self.wait_seconds)
+            batch = self._take_batch()
+            if not any(self._queues.values()):
+                self._pending.clear()
+            if not batch:
+                continue
+
+            sentences = [sentence for request, _ in batch for sentence in request]
+            try:
+                embeddings = await asyncio.to_thread(self.encode, sentences)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for request, future in batch:
+                if not future.done():
+                    future.set_result(embeddings[start:start + len(request)])
+                start += len(request)
+            increment("embeddings.batches")
+            observe("embeddings.batch_size", len(sentences))
+            observe("embeddings.requests_per_batch", len(batch))
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for queue in self._queues.values():
+            while queue:
+                _, future = queue.popleft()
+                if not future.done():
+                    future.cancel()
+
+
+_dispatcher = None
+
+
+def get_embedding_dispatcher() -> EmbeddingDispatcher:
+    global _dispatcher
+    if _dispatcher is None or _dispatcher.loop is not asyncio.get_running_loop():
+        _dispatcher = EmbeddingDispatcher(encode)
+    return _dispatcher
+
+
+async def stop_embedding_dispatcher():
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+
+
+async def embed_sentences(sentences, priority: int = INGEST_PRIORITY):
+    if len(sentences) == 0:
+        return []
+    embeddings = await get_embedding_dispatcher().submit(list(sentences), priority)
     return embeddings.tolist()
@@ -0,0 +1,211 @@
+import os
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", CACHE_DIR / "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = 1.0
+
+JOB_FIELDS = "id, kind, user_id, doc_id, organization_id, reporting_year, status, error, created_at, started_at, finished_at"
+
+_conn = None
+_conn_lock = threading.Lock()
+_job_available = asyncio.Event()
+_workers = []
+_stopping = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(JOBS_DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                organization_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                csv BLOB,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "reporting_year" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN reporting_year INTEGER")
+        # Portfolio jobs carry their manifest as payload, keyed by its digest in doc_id.
+        if "kind" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'extract'")
+            conn.execute("ALTER TABLE jobs ADD COLUMN payload TEXT")
+            conn.execute("ALTER TABLE jobs ADD COLUMN result BLOB")
+        conn.execute("DROP INDEX IF EXISTS jobs_user_doc")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_doc_org ON jobs (user_id, doc_id, organization_id, status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _enqueue(user_id: str, doc_id: str, organization_id: str, reporting_year: int | None, refresh: bool, kind: str = "extract", payload: str | None = None):
+    with _conn_lock:
+        conn = _connect()
+        reusable = ("queued", "running") if refresh else ("queued", "running", "done")
+        existing = conn.execute(
+            f"SELECT {JOB_FIELDS} FROM jobs WHERE kind = ? AND user_id = ? AND doc_id = ? AND organization_id = ? AND reporting_year IS ? "
+            f"AND status IN ({','.join('?' * len(reusable))}) ORDER BY created_at DESC LIMIT 1",
+            (kind, user_id, doc_id, organization_id, reporting_year, *reusable)
+        ).fetchone()
+        if existing:
+            return dict(existing), False
+
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, kind, user_id, doc_id, organization_id, reporting_year, payload, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, kind, user_id, doc_id, organization_id, reporting_year, payload, time.time())
+        )
+        conn.commit()
+        row = conn.execute(f"SELECT {JOB_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row), True
+
+
+def _claim():
+    with _conn_lock:
+        conn = _connect()
+        row = conn.execute(
+            f"SELECT {JOB_FIELDS}, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+            (time.time(), row["id"])
+        )
+        conn.commit()
+        return {**dict(row), "status": "running"}
+
+
+def _finish(job, output: bytes | None, error: str | None):
+    column = "result" if job["kind"] == "portfolio" else "csv"
+    with _conn_lock:
+        conn = _connect()
+        conn.execute(
+            f"UPDATE jobs SET status = ?, {column} = ?, error = ?, finished_at = ? WHERE id = ?",
+            ("failed" if error else "done", output, error, time.time(), job["id"])
+        )
+        conn.commit()
+
+
+def _get(job_id: str):
+    with _conn_lock:
+        row = _connect().execute(f"SELECT {JOB_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def _get_csv(job_id: str):
+    with _conn_lock:
+        row = _connect().execute("SELECT csv FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _get_result(job_id: str):
+    with _conn_lock:
+        row = _connect().execute("SELECT result FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _requeue_interrupted():
+    with _conn_lock:
+        conn = _connect()
+        count = conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'").rowcount
+        conn.commit()
+    return count
+
+
+async def enqueue_job(user_id: str, doc_id: str, organization_id: str, reporting_year: int | None = None, refresh: bool = False):
+    job, created = await asyncio.to_thread(_enqueue, user_id, doc_id, organization_id, reporting_year, refresh)
+    if created:
+        _job_available.set()
+    return job, created
+
+
+async def enqueue_portfolio_job(manifest: str, refresh: bool = False):
+    """Queue a portfolio manifest (JSON); re-posting the same manifest returns its job."""
+    digest = hashlib.sha256(manifest.encode("utf-8")).hexdigest()
+    job, created = await asyncio.to_thread(_enqueue, "", digest, "", None, refresh, "portfolio", manifest)
+    if created:
+        _job_available.set()
+    return job, created
+
+
+async def get_job(job_id: str):
+    return await asyncio.to_thread(_get, job_id)
+
+
+async def get_job_csv(job_id: str):
+    return await asyncio.to_thread(_get_csv, job_id)
+
+
+async def get_job_result(job_id: str):
+    return await asyncio.to_thread(_get_result, job_id)
+
+
+async def _worker(worker_id: int, process):
+    # wait_for can swallow a cancellation that races with the event being
+    # set, so workers also check the stop flag on every iteration.
+    while not _stopping:
+        _job_available.clear()
+        job = await asyncio.to_thread(_claim)
+        if job is None:
+            try:
+                await asyncio.wait_for(_job_available.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info(f"Worker {worker_id} running {job['kind']} job {job['id']} for document {job['doc_id']}")
+        try:
+            output = await process(job)
+            await asyncio.to_thread(_finish, job, output, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            await asyncio.to_thread(_finish, job, None, str(e))
+
+
+async def start_job_workers(process, workers: int = JOB_WORKERS):
+    global _stopping
+    _stopping = False
+    requeued = await asyncio.to_thread(_requeue_interrupted)
+    if requeued:
+        logger.info(f"Re-queued {requeued} job(s) interrupted by the last shutdown")
+    for worker_id in range(workers):
+        _workers.append(asyncio.create_task(_worker(worker_id, process)))
+
+
+async def stop_job_workers():
+    global _stopping
+    _stopping = True
+    _job_available.set()
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,77 @@
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from src.metrics import increment
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", CACHE_DIR / "llm_responses.sqlite3"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def response_key(model_name: str, system_prompt: str, user_prompt: str) -> str:
+    payload = "\0".join([model_name, system_prompt, user_prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        LLM_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_created_at ON llm_responses (created_at)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _get(key: str):
+    with _conn_lock:
+        row = _connect().execute(
+            "SELECT response FROM llm_responses WHERE key = ? AND created_at >= ?",
+            (key, time.time() - LLM_CACHE_TTL_SECONDS)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def _put(key: str, response: str):
+    now = time.time()
+    with _conn_lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, response, created_at) VALUES (?, ?, ?)",
+            (key, response, now)
+        )
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - LLM_CACHE_TTL_SECONDS,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+        if count > LLM_CACHE_MAX_ENTRIES:
+            conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY created_at LIMIT ?)",
+                (count - LLM_CACHE_MAX_ENTRIES,)
+            )
+        conn.commit()
+
+
+async def get_cached_response(key: str) -> str | None:
+    response = await asyncio.to_thread(_get, key)
+    increment("llm_cache.hits" if response is not None else "llm_cache.misses")
+    return response
+
+
+async def store_response(key: str, response: str):
+    await asyncio.to_thread(_put, key, response)
@@ -1,10 +1,17 @@
 
+import os
+import logging
 from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from pathlib import Path
 from dotenv import load_dotenv
+from src.llm_cache import LLM_CACHE_ENABLED, response_key, get_cached_response, store_response
+from src.metrics import increment, observe
+from src.tokens import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 load_dotenv(PROJECT_ROOT / ".env")
@@ -12,8 +19,12 @@ load_dotenv(PROJECT_ROOT / ".env")
 
 
 
+LLM_MODEL_NAME = "ministral-8b-latest"
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+MIN_PASSAGE_TOKENS = 50
+
 mistral_primary = ChatMistralAI(
-    model="ministral-8b-latest",
+    model=LLM_MODEL_NAME,
     temperature=0,
     max_retries=1,
 )
@@ -34,7 +45,18 @@ class Quantity(BaseModel):
     )
 
 
+class IndicatorQuantity(Quantity):
+    indicator_key: str = Field(
+        description="Key of the indicator this value answers, copied exactly from the request"
+    )
+
+
+class QuantityList(BaseModel):
+    items: List[IndicatorQuantity]
+
+
 mistral_model = mistral_primary.with_structured_output(Quantity)
+mistral_group_model = mistral_primary.with_structured_output(QuantityList)
 
 
 
@@ -70,19 +92,102 @@ Document Chunks:
 {chunk_block}
 """
 
+GROUP_SYSTEM_PROMPT = """
+Return ONLY a JSON structured QuantityList tool output.
+Return one item per requested indicator and copy its key into indicator_key.
+Use only the provided chunks.
+Do NOT infer or estimate values.
+Rules:
+- Extract only explicitly reported values
+- Prefer latest reporting year
+- Prefer consolidated / group values
+- Preserve the unit exactly as written
+- Return exactly one value per indicator
+If multiple candidates exist for an indicator:
+- choose the clearest and best-labeled one
+- explain selection briefly in `notes`
+- fill `source_section` with the closest heading or table title
+If an indicator is not found:
+- return null fields for that item
+- confidence = 0
+- notes = "value not found in provided chunks"
+"""
+
+GROUP_USER_PROMPT = """
+Indicators:
+{indicator_block}
+Document Chunks:
+{chunk_block}
+"""
+
 prompt_template = ChatPromptTemplate.from_messages([
     ("system", SYSTEM_PROMPT),
     ("user", "{user_prompt}")
 ])
 
+group_prompt_template = ChatPromptTemplate.from_messages([
+    ("system", GROUP_SYSTEM_PROMPT),
+    ("user", "{user_prompt}")
+])
+
+
+
+
+def merge_adjacent_chunks(chunks):
+    """Join consecutive chunks of the same page, dropping the overlap the
+    chunker carried into each (``overlap_words``; chunks indexed before it
+    was recorded carry none and are joined whole).
+
+    Merged passages keep the position of their best-ranked chunk, so the
+    prompt still leads with the most relevant evidence.
+    """
+    passages = []
+    by_position = {}
+    for rank, c in enumerate(chunks):
+        if c.get("chunk_index") is None:
+            passages.append({"rank": rank, "page": c.get("page"), "words": (c.get("text") or "").split()})
+            continue
+        by_position.setdefault((c.get("document_id"), c.get("page"), c.get("chunk_index")), (rank, c))
+
+    ordered = sorted(by_position.items(), key=lambda item: (str(item[0][0]), str(item[0][1]), item[0][2]))
+    current = None
+    for (doc_id, page, chunk_index), (rank, c) in ordered:
+        words = (c.get("text") or "").split()
+        if current and current["key"] == (doc_id, page) and current["last_index"] + 1 == chunk_index:
+            current["words"].extend(words[c.get("overlap_words") or 0:])
+            current["last_index"] = chunk_index
+            current["rank"] = min(current["rank"], rank)
+            continue
+        current = {"key": (doc_id, page), "last_index": chunk_index, "rank": rank, "page": page, "words": list(words)}
+        passages.append(current)
+
+    passages.sort(key=lambda p: p["rank"])
+    return [{"page": p["page"], "text": " ".join(p["words"])} for p in passages]
+
+
+def build_chunk_block(chunks, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    blocks = []
+    remaining = token_budget
+    for passage in merge_adjacent_chunks(chunks):
+        header = f"\n[PAGE {passage['page'] if passage['page'] is not None else 'Unknown'}]\n"
+        available = remaining - estimate_tokens(header)
+        if available < MIN_PASSAGE_TOKENS:
+            break
+        text = truncate_to_tokens(passage["text"], available)
+        blocks.append(f"{header}{text}\n")
+        remaining -= estimate_tokens(header) + estimate_tokens(text)
+    return "\n".join(blocks)
+
 
+def record_prompt_tokens(label: str, user_prompt: str, system_prompt: str) -> int:
+    tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    observe("llm.prompt_tokens", tokens)
+    increment(f"llm.prompt_tokens.{label}", tokens)
+    return tokens
 
 
 async def build_prompt(indicator_name: str, question: str, units: List[str], chunks):
-    chunk_block = "\n".join(
-        f"\n[PAGE {c.get('page', 'Unknown')}]\n{c.get('text', '')}\n"
-        for c in chunks
-    )
+    chunk_block = build_chunk_block(chunks)
     return USER_PROMPT.format(
         indicator_name=indicator_name,
         question=question,
@@ -91,19 +196,61 @@ async def build_prompt(indicator_name: str, question: str, units: List[str], chu
     )
 
 
-async def run_chain(model, user_prompt: str):
-    chain = prompt_template | model
+async def build_group_prompt(specs, chunks):
+    indicator_block = "\n".join(
+        f"- key: {key}\n  indicator: {spec['indicator_name']}\n  question: {spec['question']}\n  allowed units: {', '.join(spec['units'])}"
+        for key, spec in specs.items()
+    )
+    # Each member gets the evidence budget a single-indicator prompt would.
+    return GROUP_USER_PROMPT.format(
+        indicator_block=indicator_block,
+        chunk_block=build_chunk_block(chunks, token_budget=PROMPT_TOKEN_BUDGET * len(specs)),
+    )
+
+
+async def run_chain(model, user_prompt: str, template=prompt_template):
+    chain = template | model
     return await chain.ainvoke({"user_prompt": user_prompt})
 
 
 
 
-async def get_response(indicator_name: str, question: str, units: List[str], chunks):
+async def get_response(indicator_name: str, question: str, units: List[str], chunks, use_cache: bool = True):
     user_prompt = await build_prompt(indicator_name, question, units, chunks)
 
-   
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    cache_key = response_key(LLM_MODEL_NAME, SYSTEM_PROMPT, user_prompt)
+    if use_cache:
+        cached = await get_cached_response(cache_key)
+        if cached is not None:
+            return Quantity.model_validate_json(cached)
+
+    record_prompt_tokens(indicator_name, user_prompt, SYSTEM_PROMPT)
     response = await run_chain(mistral_model, user_prompt)
-    print(indicator_name, "--", response)
+    logger.debug(f"Response for {indicator_name}: {response}")
+    if use_cache and response is not None:
+        await store_response(cache_key, response.model_dump_json())
     return response
- 
-       
+
+
+async def get_group_response(specs, chunks, use_cache: bool = True):
+    user_prompt = await build_group_prompt(specs, chunks)
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    cache_key = response_key(LLM_MODEL_NAME, GROUP_SYSTEM_PROMPT, user_prompt)
+    response = None
+    if use_cache:
+        cached = await get_cached_response(cache_key)
+        if cached is not None:
+            response = QuantityList.model_validate_json(cached)
+
+    if response is None:
+        record_prompt_tokens("+".join(specs), user_prompt, GROUP_SYSTEM_PROMPT)
+        response = await run_chain(mistral_group_model, user_prompt, group_prompt_template)
+        logger.debug(f"Group response for {list(specs)}: {response}")
+        if use_cache and response is not None:
+            await store_response(cache_key, response.model_dump_json())
+
+    if response is None:
+        return {}
+    return {item.indicator_key: item for item in response.items if item.indicator_key in specs}
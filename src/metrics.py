@@ -0,0 +1,30 @@
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_observations = {}
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float):
+    with _lock:
+        stats = _observations.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += value
+        stats["max"] = max(stats["max"], value)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "observations": {
+                name: {**stats, "mean": stats["total"] / stats["count"]}
+                for name, stats in _observations.items()
+            },
+        }
@@ -1,41 +1,292 @@
+import os
+import asyncio
+import logging
 from pathlib import Path
 import pandas as pd
 import io
-from src.text_extraction import extract_text_from_pdf
-from src.embeddings import embed_sentences
-from database.vector_db import upsert_document_vectors, query_vector_index
-from src.prompts.questions import FUNDAMENTAL_RAG_SPEC
-
-async def upload_file(file_path: Path, user_id: str):
-    chunks_dict = await extract_text_from_pdf(file_path)
-    records = [{"page": page, "chunk_index": chunk_idx, "text": text} for (page, chunk_idx), text in sorted(chunks_dict.items())]
-    vectors = await embed_sentences([r["text"] for r in records])
-    await upsert_document_vectors(namespace=user_id, document_id=file_path.name, vectors=vectors, chunks=records)
-    return file_path.name, records
-
-async def extract_indicator(user_id: str, doc_ids: list[str], get_response):
-    results = {}
-
-    async def ask_indicator(spec, chunks):
-        async def ask(question):
-            return await get_response(indicator_name=spec["indicator_name"], question=question, units=spec["units"], chunks=chunks)
-        response = await ask(spec["question"])
-        if response.value is not None and (response.confidence or 0) >= 0.6:
-            return response
-        for alt_q in spec.get("alt_questions", []):
-            alt_resp = await ask(alt_q)
-            if alt_resp.value is not None and (alt_resp.confidence or 0) >= 0.6:
-                return alt_resp
+from src.text_extraction import iter_pdf_chunks, describe_source
+from src.question_vectors import get_question_vector
+from src.embedding_cache import embed_with_cache
+from src.embeddings import EMBEDDING_MODEL_ID
+from src.chunking import CHUNKER_VERSION, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+from database.vector_db import upsert_document_vectors, delete_document_vectors, query_vector_index, chunk_vector_id, UPSERT_CONCURRENCY
+from database.utils import store_chunk_lemmas
+from database.bm25_index import BM25IndexBuilder, save_bm25_index
+from database.document_registry import get_document, set_document_status
+from src.prompts.questions import FUNDAMENTAL_RAG_SPEC, INDICATOR_GROUPS
+from src.alt_questions import ALT_QUESTION_STRATEGY, HEDGE_DELAY_SECONDS, ask_first_confident, is_confident, question_label
+from src.metrics import increment
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "5"))
+INDICATOR_TIMEOUT = float(os.getenv("INDICATOR_TIMEOUT", "120"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single")
+GROUP_OVERLAP_THRESHOLD = float(os.getenv("GROUP_OVERLAP_THRESHOLD", "0.6"))
+GROUP_MAX_SIZE = 5
+# Documents indexed under a different chunker or embedding setup are re-ingested.
+INDEX_VERSION = f"chunker{CHUNKER_VERSION}-{CHUNK_TOKENS}-{CHUNK_OVERLAP_TOKENS}|{EMBEDDING_MODEL_ID}"
+
+async def upload_file(source: Path | bytes, user_id: str, document_id: str | None = None):
+    if document_id is None:
+        if isinstance(source, (bytes, bytearray)):
+            raise ValueError("document_id is required for in-memory uploads")
+        document_id = source.name
+    chunk_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    vector_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    chunk_count = 0
+    bm25_builder = BM25IndexBuilder()
+    # Shared by every batch, so byte-split sub-batches don't multiply the limit.
+    upsert_slots = asyncio.Semaphore(UPSERT_CONCURRENCY)
+
+    async def extract_stage():
+        batch = []
+        async for record in iter_pdf_chunks(source):
+            batch.append(record)
+            if len(batch) >= EMBED_BATCH_SIZE:
+                await chunk_queue.put(batch)
+                batch = []
+        if batch:
+            await chunk_queue.put(batch)
+        await chunk_queue.put(None)
+
+    async def embed_stage():
+        while (batch := await chunk_queue.get()) is not None:
+            vectors = await embed_with_cache([r["text"] for r in batch])
+            await vector_queue.put((batch, vectors))
+        await vector_queue.put(None)
+
+    async def upsert_batch(batch, vectors):
+        nonlocal chunk_count
+        chunk_ids = [chunk_vector_id(document_id, r["page"], r["chunk_index"]) for r in batch]
+        _, tokens = await asyncio.gather(
+            upsert_document_vectors(namespace=user_id, document_id=document_id, vectors=vectors, chunks=batch, semaphore=upsert_slots),
+            store_chunk_lemmas(chunk_ids, [r["text"] for r in batch]),
+        )
+        for chunk_id, chunk_tokens in zip(chunk_ids, tokens):
+            bm25_builder.add(chunk_id, chunk_tokens)
+        chunk_count += len(batch)
+
+    async def upsert_stage():
+        in_flight = set()
+        try:
+            while (item := await vector_queue.get()) is not None:
+                if len(in_flight) >= UPSERT_CONCURRENCY:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                in_flight.add(asyncio.create_task(upsert_batch(*item)))
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    tasks = [asyncio.create_task(stage()) for stage in (extract_stage, embed_stage, upsert_stage)]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        logger.error(f"Ingestion failed for {describe_source(source)}: {str(e)}")
+        raise
+
+    await save_bm25_index(user_id, document_id, bm25_builder)
+
+    logger.info(f"Ingested {chunk_count} chunks from {describe_source(source)} into namespace {user_id}")
+    return document_id, chunk_count
+
+async def ingest_document(source: Path | bytes, user_id: str, content_hash: str, filename: str | None = None, path: str | None = None):
+    existing = await get_document(user_id, content_hash)
+    if existing and existing["status"] == "indexed" and existing["index_version"] == INDEX_VERSION:
+        logger.info(f"Document {content_hash} already indexed in namespace {user_id}, skipping ingestion")
+        return content_hash, existing["chunk_count"], False
+
+    if path is None and isinstance(source, Path):
+        path = str(source)
+    await set_document_status(user_id, content_hash, "ingesting", filename=filename, path=path)
+    try:
+        if existing and existing["index_version"] != INDEX_VERSION:
+            # Chunk ids from the old layout would otherwise linger next to the new ones.
+            logger.info(f"Re-indexing {content_hash} in namespace {user_id}: {existing['index_version']} -> {INDEX_VERSION}")
+            await delete_document_vectors(user_id, content_hash)
+        _, chunk_count = await upload_file(source, user_id, document_id=content_hash)
+    except Exception:
+        await set_document_status(user_id, content_hash, "failed")
+        raise
+    await set_document_status(user_id, content_hash, "indexed", chunk_count=chunk_count, index_version=INDEX_VERSION)
+    return content_hash, chunk_count, True
+
+def empty_result(spec, status, notes=None):
+    return {"indicator_name": spec["indicator_name"], "value": None, "unit": None, "page": None, "confidence": 0.0, "status": status, "source_section": None, "notes": notes}
+
+def to_result(spec, response):
+    return {"indicator_name": spec["indicator_name"], "value": response.value, "unit": response.unit if response.unit in spec["units"] else None, "page": getattr(response, "page_reference", None), "confidence": response.confidence or 0.0, "status": "ok" if response.value else "not_found", "source_section": getattr(response, "source_section", None), "notes": getattr(response, "notes", None)}
+
+def chunk_overlap(chunks_a, chunks_b) -> float:
+    ids_a = {c["id"] for c in chunks_a}
+    ids_b = {c["id"] for c in chunks_b}
+    return len(ids_a & ids_b) / max(len(ids_a | ids_b), 1)
+
+def merge_chunks(chunk_lists):
+    # Interleave by rank so every member's best evidence comes before any
+    # member's weaker chunks.
+    merged = {}
+    for rank in range(max((len(chunks) for chunks in chunk_lists), default=0)):
+        for chunks in chunk_lists:
+            if rank < len(chunks):
+                merged.setdefault(chunks[rank]["id"], chunks[rank])
+    return list(merged.values())
+
+def plan_groups(chunks_by_key, threshold: float = GROUP_OVERLAP_THRESHOLD, max_size: int = GROUP_MAX_SIZE):
+    groups = []
+    assigned = set()
+
+    for members in INDICATOR_GROUPS.values():
+        present = [key for key in members if key in chunks_by_key and key not in assigned]
+        if present:
+            groups.append(present)
+            assigned.update(present)
+
+    for key, chunks in chunks_by_key.items():
+        if key in assigned:
+            continue
+        group = [key]
+        assigned.add(key)
+        for other, other_chunks in chunks_by_key.items():
+            if len(group) >= max_size:
+                break
+            if other not in assigned and chunk_overlap(chunks, other_chunks) >= threshold:
+                group.append(other)
+                assigned.add(other)
+        groups.append(group)
+
+    return groups
+
+async def iter_indicator_results(user_id: str, doc_ids: list[str], get_response, max_concurrency: int = EXTRACT_CONCURRENCY, indicator_timeout: float = INDICATOR_TIMEOUT, mode: str = EXTRACTION_MODE, get_group_response=None, alt_strategy: str = ALT_QUESTION_STRATEGY, hedge_delay: float = HEDGE_DELAY_SECONDS, semaphore: asyncio.Semaphore | None = None):
+    """Yield ``(indicator_key, result)`` pairs as each indicator resolves.
+
+    Pass ``semaphore`` to share one in-flight limit across several runs.
+    """
+    semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+
+    async def ask_indicator(key, chunks):
+        spec = FUNDAMENTAL_RAG_SPEC[key]
+        questions = [spec["question"], *spec.get("alt_questions", [])]
+        calls = [
+            lambda question=question: get_response(indicator_name=spec["indicator_name"], question=question, units=spec["units"], chunks=chunks)
+            for question in questions
+        ]
+        winner, response = await ask_first_confident(calls, alt_strategy, hedge_delay)
+        increment(f"question_wins.{key}.{question_label(winner)}")
         return response
 
-    for indicator_key, spec in FUNDAMENTAL_RAG_SPEC.items():
+    async def retrieve(spec):
         query_text = spec["question"]
-        vector = (await embed_sentences([query_text]))[0]
-        chunks = await query_vector_index(user_id=user_id, vector=vector, doc_ids=doc_ids, query=query_text)
+        vector = await get_question_vector(query_text)
+        return await query_vector_index(user_id=user_id, vector=vector, doc_ids=doc_ids, query=query_text)
+
+    async def run_indicator(key):
+        spec = FUNDAMENTAL_RAG_SPEC[key]
+        chunks = await retrieve(spec)
         if not chunks:
-            results[indicator_key] = {"indicator_name": spec["indicator_name"], "value": None, "unit": None, "page": None, "confidence": 0.0, "status": "no_chunks_found", "source_section": None, "notes": None}
-            continue
-        response = await ask_indicator(spec, chunks)
-        results[indicator_key] = {"indicator_name": spec["indicator_name"], "value": response.value, "unit": response.unit if response.unit in spec["units"] else None, "page": getattr(response, "page_reference", None), "confidence": response.confidence or 0.0, "status": "ok" if response.value else "not_found", "source_section": getattr(response, "source_section", None), "notes": getattr(response, "notes", None)}
-    return results
+            return empty_result(spec, "no_chunks_found")
+        response = await ask_indicator(key, chunks)
+        return to_result(spec, response)
+
+    async def answer_alone(key, chunks):
+        return {key: to_result(FUNDAMENTAL_RAG_SPEC[key], await ask_indicator(key, chunks))}
+
+    async def ask_group(group_keys, chunks_by_key):
+        """Answer a group in one call; members left as None need their own fallback."""
+        if len(group_keys) == 1:
+            return await answer_alone(group_keys[0], chunks_by_key[group_keys[0]])
+
+        group_specs = {key: FUNDAMENTAL_RAG_SPEC[key] for key in group_keys}
+        chunks = merge_chunks([chunks_by_key[key] for key in group_keys])
+        increment("extraction.group_calls")
+        try:
+            answers = await get_group_response(specs=group_specs, chunks=chunks)
+        except Exception as e:
+            logger.warning(f"Grouped extraction failed for {group_keys}, falling back per indicator: {str(e)}")
+            answers = {}
+
+        results = {
+            key: to_result(group_specs[key], answers[key]) if is_confident(answers.get(key)) else None
+            for key in group_keys
+        }
+        fallbacks = sum(result is None for result in results.values())
+        increment("extraction.group_answers", len(results) - fallbacks)
+        increment("extraction.group_fallbacks", fallbacks)
+        return results
+
+    async def guarded(label, make_coro, on_failure):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(make_coro(), timeout=indicator_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Indicator {label} timed out after {indicator_timeout}s")
+                return on_failure("timeout", f"extraction timed out after {indicator_timeout}s")
+            except Exception as e:
+                logger.error(f"Indicator {label} failed: {str(e)}")
+                return on_failure("error", str(e))
+
+    async def keyed(key, coro):
+        return key, await coro
+
+    tasks = []
+    try:
+        if mode != "grouped" or get_group_response is None:
+            tasks = [
+                asyncio.create_task(keyed(key, guarded(key, lambda key=key: run_indicator(key), lambda status, notes, spec=spec: empty_result(spec, status, notes))))
+                for key, spec in FUNDAMENTAL_RAG_SPEC.items()
+            ]
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+            return
+
+        chunks_by_key = {}
+        tasks = [
+            asyncio.create_task(keyed(key, guarded(key, lambda spec=spec: retrieve(spec), lambda status, notes, spec=spec: empty_result(spec, status, notes))))
+            for key, spec in FUNDAMENTAL_RAG_SPEC.items()
+        ]
+        for next_done in asyncio.as_completed(tasks):
+            key, outcome = await next_done
+            if isinstance(outcome, dict):
+                yield key, outcome
+            elif not outcome:
+                yield key, empty_result(FUNDAMENTAL_RAG_SPEC[key], "no_chunks_found")
+            else:
+                chunks_by_key[key] = outcome
+
+        # Each group call and each fallback holds its own slot and timeout, so
+        # fallbacks queue behind the in-flight limit like any other indicator.
+        tasks = {
+            asyncio.create_task(guarded(
+                ",".join(group),
+                lambda group=group: ask_group(group, chunks_by_key),
+                lambda status, notes, group=group: {key: empty_result(FUNDAMENTAL_RAG_SPEC[key], status, notes) for key in group},
+            ))
+            for group in plan_groups(chunks_by_key)
+        }
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for key, result in task.result().items():
+                    if result is not None:
+                        yield key, result
+                        continue
+                    tasks.add(asyncio.create_task(guarded(
+                        key,
+                        lambda key=key: answer_alone(key, chunks_by_key[key]),
+                        lambda status, notes, key=key: {key: empty_result(FUNDAMENTAL_RAG_SPEC[key], status, notes)},
+                    )))
+    finally:
+        for task in tasks:
+            task.cancel()
 
+async def extract_indicator(user_id: str, doc_ids: list[str], get_response, **options):
+    results = {key: result async for key, result in iter_indicator_results(user_id, doc_ids, get_response, **options)}
+    return {key: results[key] for key in FUNDAMENTAL_RAG_SPEC}
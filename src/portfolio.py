@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import List, Optional
+from pydantic import BaseModel
+from src.orchestrator import ingest_document, extract_indicator, INDEX_VERSION
+from src.calulation import calculate_esrs_indicators, save_esrs_metrics
+from src.question_vectors import load_question_vectors
+from database.document_registry import get_document
+from database.database import MetricWriteBuffer
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "16"))
+PORTFOLIO_ITEM_CONCURRENCY = int(os.getenv("PORTFOLIO_ITEM_CONCURRENCY", "4"))
+PORTFOLIO_INGEST_CONCURRENCY = int(os.getenv("PORTFOLIO_INGEST_CONCURRENCY", "2"))
+
+
+class PortfolioItem(BaseModel):
+    organization_id: str
+    user_id: str
+    doc_ids: List[str]
+    reporting_year: Optional[int] = None
+
+
+class PortfolioRequest(BaseModel):
+    items: List[PortfolioItem]
+
+
+async def run_portfolio(items: List[PortfolioItem], get_response, get_group_response=None):
+    """Ingest (where needed) and extract every manifest item under shared limits.
+
+    All items share one indicator semaphore, so PORTFOLIO_CONCURRENCY bounds
+    the LLM/vector work of the whole run rather than of each document.
+    """
+    await load_question_vectors()
+    indicator_slots = asyncio.Semaphore(PORTFOLIO_CONCURRENCY)
+    item_slots = asyncio.Semaphore(PORTFOLIO_ITEM_CONCURRENCY)
+    ingest_slots = asyncio.Semaphore(PORTFOLIO_INGEST_CONCURRENCY)
+    ingestions = {}
+    metric_buffer = MetricWriteBuffer()
+
+    async def ingest(user_id: str, doc_id: str):
+        document = await get_document(user_id, doc_id)
+        if document is None:
+            # Indexed before the registry existed (filename ids): extract as /extract would.
+            return False
+        available = bool(document and document.get("path") and Path(document["path"]).exists())
+        if document and document["status"] == "indexed":
+            # Re-index outdated documents when the original is still on disk.
+            if document["index_version"] == INDEX_VERSION or not available:
+                return False
+        if not available:
+            raise ValueError(f"Document {doc_id} has not been uploaded for user {user_id}")
+        async with ingest_slots:
+            _, _, ingested = await ingest_document(Path(document["path"]), user_id, doc_id, filename=document.get("filename"))
+        return ingested
+
+    def ensure_indexed(user_id: str, doc_id: str):
+        key = (user_id, doc_id)
+        if key not in ingestions:
+            ingestions[key] = asyncio.create_task(ingest(user_id, doc_id))
+        return ingestions[key]
+
+    async def run_item(item: PortfolioItem):
+        summary = {"organization_id": item.organization_id, "user_id": item.user_id, "doc_ids": item.doc_ids}
+        async with item_slots:
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*[ensure_indexed(item.user_id, doc_id) for doc_id in item.doc_ids])
+                results = await extract_indicator(
+                    user_id=item.user_id,
+                    doc_ids=item.doc_ids,
+                    get_response=get_response,
+                    get_group_response=get_group_response,
+                    semaphore=indicator_slots
+                )
+                esrs = await calculate_esrs_indicators(results)
+                await save_esrs_metrics(esrs, item.organization_id, item.reporting_year, buffer=metric_buffer)
+            except Exception as e:
+                logger.error(f"Portfolio item for organization {item.organization_id} failed: {str(e)}")
+                return {**summary, "status": "failed", "error": str(e), "elapsed_s": time.perf_counter() - started}
+
+            failed = [key for key, result in results.items() if result["status"] in ("timeout", "error")]
+            return {
+                **summary,
+                "status": "partial" if failed else "ok",
+                "failed_indicators": failed,
+                "indicators": esrs,
+                "elapsed_s": time.perf_counter() - started,
+            }
+
+    started = time.perf_counter()
+    item_results = await asyncio.gather(*[run_item(item) for item in items])
+    # An item whose gather failed early can leave sibling ingestions running.
+    await asyncio.gather(*ingestions.values(), return_exceptions=True)
+    metrics_error = None
+    try:
+        await metric_buffer.flush()
+    except Exception as e:
+        logger.error(f"Portfolio metric write failed: {str(e)}")
+        metrics_error = str(e)
+    elapsed = time.perf_counter() - started
+
+    extracted = sum(len(r.get("indicators", {})) for r in item_results)
+    stats = {
+        "items": len(item_results),
+        "ok": sum(1 for r in item_results if r["status"] == "ok"),
+        "partial": sum(1 for r in item_results if r["status"] == "partial"),
+        "failed": sum(1 for r in item_results if r["status"] == "failed"),
+        "metrics_written": metric_buffer.written,
+        "metrics_error": metrics_error,
+        "documents_ingested": sum(1 for task in ingestions.values() if not task.cancelled() and task.exception() is None and task.result()),
+        "elapsed_s": elapsed,
+        "items_per_minute": len(item_results) * 60 / max(elapsed, 1e-6),
+        "indicators_per_second": extracted / max(elapsed, 1e-6),
+    }
+    return {"items": item_results, "stats": stats}
@@ -279,3 +279,16 @@ FUNDAMENTAL_RAG_SPEC = {
         ]
     }
 }
+
+
+# Indicators usually reported side by side in the same table or paragraph.
+# In grouped extraction mode each group is answered with one LLM call.
+INDICATOR_GROUPS = {
+    "ghg_emissions": ["Scope1_Emissions", "Scope2_Emissions", "Scope3_Emissions"],
+    "energy": ["Total_Energy", "Renewable_Energy"],
+    "workforce": ["Total_Employees", "Female_Employees", "Average_Employees", "Employees_Left"],
+    "salary": ["Avg_Salary_Male", "Avg_Salary_Female"],
+    "board": ["Female_Board_Members", "Total_Board_Members", "Board_Meetings"],
+    "suppliers": ["Suppliers_Screened_ESG", "Total_Suppliers"],
+    "payables": ["Trade_Payables", "Purchases_From_Suppliers"],
+}
@@ -0,0 +1,90 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+import numpy as np
+from src.embeddings import EMBEDDING_MODEL_ID, QUERY_PRIORITY, embed_sentences
+from src.prompts.questions import FUNDAMENTAL_RAG_SPEC
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = Path(os.getenv("CACHE_DIR", PROJECT_ROOT / "cache"))
+
+_question_rows = None
+_question_matrix = None
+_vectors_lock = asyncio.Lock()
+
+
+def spec_questions(spec) -> list[str]:
+    texts = []
+    for item in spec.values():
+        texts.append(item["question"])
+        texts.extend(item.get("alt_questions", []))
+    return list(dict.fromkeys(texts))
+
+
+def spec_hash(spec) -> str:
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def vectors_path(model_name: str, spec) -> Path:
+    model_slug = model_name.replace("/", "__")
+    return CACHE_DIR / f"question_vectors_{model_slug}_{spec_hash(spec)}.npy"
+
+
+def _load_matrix(path: Path, expected_rows: int):
+    if not path.exists():
+        return None
+    try:
+        matrix = np.load(path, mmap_mode="r")
+    except Exception as e:
+        logger.warning(f"Discarding unreadable question vector cache {path}: {str(e)}")
+        return None
+    if matrix.ndim != 2 or matrix.shape[0] != expected_rows:
+        return None
+    return matrix
+
+
+def _save_matrix(path: Path, matrix: np.ndarray):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, matrix)
+    os.replace(tmp_path, path)
+
+    for stale in path.parent.glob(f"question_vectors_{EMBEDDING_MODEL_ID.replace('/', '__')}_*.npy"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+
+
+async def load_question_vectors(spec=FUNDAMENTAL_RAG_SPEC):
+    global _question_rows, _question_matrix
+    async with _vectors_lock:
+        if _question_matrix is not None:
+            return
+
+        texts = spec_questions(spec)
+        path = vectors_path(EMBEDDING_MODEL_ID, spec)
+        matrix = await asyncio.to_thread(_load_matrix, path, len(texts))
+
+        if matrix is None:
+            logger.info(f"Embedding {len(texts)} spec questions into {path}")
+            vectors = np.asarray(await embed_sentences(texts, priority=QUERY_PRIORITY), dtype=np.float32)
+            await asyncio.to_thread(_save_matrix, path, vectors)
+            matrix = await asyncio.to_thread(_load_matrix, path, len(texts))
+            if matrix is None:
+                matrix = vectors
+
+        _question_rows = {text: row for row, text in enumerate(texts)}
+        _question_matrix = matrix
+
+
+async def get_question_vector(text: str) -> list[float]:
+    await load_question_vectors()
+    row = _question_rows.get(text)
+    if row is None:
+        return (await embed_sentences([text], priority=QUERY_PRIORITY))[0]
+    return _question_matrix[row].tolist()
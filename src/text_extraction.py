@@ -1,66 +1,163 @@
+import os
+import time
 import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from pathlib import Path
 import fitz
 import logging
+from src.chunking import chunk_blocks
 
 logger = logging.getLogger(__name__)
 
-chunk_size = 250
-overlap = 50
-async def chunk_words(words, ):
-    step = chunk_size - overlap
-    chunk_index = 1
-
-    for start in range(0, len(words), step):
-        end = start + chunk_size
-        yield chunk_index, " ".join(words[start:end])
-        chunk_index += 1
-        await asyncio.sleep(0)
-
-
-
-async def extract_text_from_pdf(pdf_path: Path) -> dict[tuple[int, int], str]:
-
-    logger.info(f"Entering extract_text_from_pdf for file: {pdf_path}")
-
-    async def load_pages():
-        def read_pdf():
-            with fitz.open(pdf_path) as doc:
-                return [(i + 1, page.get_text().strip())
-                        for i, page in enumerate(doc)]
-        return await asyncio.to_thread(read_pdf)
+PAGES_PER_READ = 8
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+
+_process_pools: dict[int, ProcessPoolExecutor] = {}
+
+# Per worker process: the last in-memory upload it opened, as (shared memory name, document).
+_worker_document = None
+
+
+def open_pdf(source: Path | bytes) -> fitz.Document:
+    # Uploads are parsed straight from memory; registered documents from disk.
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def describe_source(source: Path | bytes) -> str:
+    if isinstance(source, (bytes, bytearray)):
+        return f"<{len(source)} byte upload>"
+    return str(source)
+
+
+def page_count(source: Path | bytes) -> int:
+    with open_pdf(source) as doc:
+        return doc.page_count
+
+
+def read_page_range(source: Path | bytes, start: int, end: int) -> list[tuple[int, list]]:
+    # Text blocks only (block type 0), as (x0, y0, x1, y1, text) for the chunker.
+    with open_pdf(source) as doc:
+        return [(i + 1, [block[:5] for block in doc[i].get_text("blocks") if block[6] == 0])
+                for i in range(start, min(end, doc.page_count))]
+
+
+def read_shared_page_range(name: str, size: int, start: int, end: int) -> list[tuple[int, list]]:
+    # Copy the upload out of shared memory once per worker and reuse it for
+    # every later range of the same upload.
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != name:
+        if _worker_document is not None:
+            _worker_document[1].close()
+            _worker_document = None
+        shared = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(shared.buf[:size])
+        finally:
+            shared.close()
+        _worker_document = (name, open_pdf(data))
+
+    doc = _worker_document[1]
+    return [(i + 1, [block[:5] for block in doc[i].get_text("blocks") if block[6] == 0])
+            for i in range(start, min(end, doc.page_count))]
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    if workers not in _process_pools:
+        _process_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _process_pools[workers]
+
+
+def shutdown_process_pools():
+    for pool in _process_pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _process_pools.clear()
+
+
+async def iter_pdf_pages(source: Path | bytes, workers: int | None = None):
+    workers = workers or PDF_WORKERS
+    started = time.perf_counter()
+    total_pages = await asyncio.to_thread(page_count, source)
+    ranges = [(start, start + PAGES_PER_READ) for start in range(0, total_pages, PAGES_PER_READ)]
+
+    if workers <= 1:
+        for start, end in ranges:
+            pages = await asyncio.to_thread(read_page_range, source, start, end)
+            for page_num, blocks in pages:
+                yield page_num, blocks
+    else:
+        # Each worker opens the document itself; in-memory uploads are placed
+        # in shared memory once rather than pickled with every range. Keep a
+        # bounded window of ranges in flight and yield them back in page order.
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool(workers)
+        shared = None
+        if isinstance(source, (bytes, bytearray)):
+            shared = shared_memory.SharedMemory(create=True, size=len(source))
+            shared.buf[:len(source)] = source
+            read_range = (read_shared_page_range, shared.name, len(source))
+        else:
+            read_range = (read_page_range, source)
+
+        try:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(loop.run_in_executor(pool, *read_range, start, end))
+                if len(pending) >= workers * 2:
+                    for page_num, blocks in await pending.popleft():
+                        yield page_num, blocks
+            while pending:
+                for page_num, blocks in await pending.popleft():
+                    yield page_num, blocks
+        finally:
+            if shared is not None:
+                shared.close()
+                shared.unlink()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Read {total_pages} pages from {describe_source(source)} with {workers} worker(s) "
+        f"in {elapsed:.2f}s ({total_pages / max(elapsed, 1e-6):.1f} pages/sec)"
+    )
+
+
+async def iter_pdf_chunks(source: Path | bytes, workers: int | None = None):
+    async for page_num, blocks in iter_pdf_pages(source, workers):
+        if not blocks:
+            continue
+
+        for chunk_idx, (chunk, overlap_words) in enumerate(chunk_blocks(blocks), start=1):
+            logger.debug(
+                f"Page {page_num} — chunk {chunk_idx} "
+                f"({len(chunk.split())} words)"
+            )
+
+            yield {"page": page_num, "chunk_index": chunk_idx, "text": chunk, "overlap_words": overlap_words}
+
+
+async def extract_text_from_pdf(source: Path | bytes, workers: int | None = None) -> dict[tuple[int, int], str]:
+
+    logger.info(f"Entering extract_text_from_pdf for file: {describe_source(source)}")
 
     try:
-        pages = await load_pages()
         results: dict[tuple[int, int], str] = {}
 
-        for page_num, text in pages:
-            if not text:
-                continue
-
-            words = text.split()
-
-            async for chunk_idx, chunk in chunk_words(words):
-                if not chunk.strip():
-                    continue
-
-                results[(page_num, chunk_idx)] = chunk
-
-                logger.debug(
-                    f"Page {page_num} — chunk {chunk_idx} "
-                    f"({len(chunk.split())} words)"
-                )
+        async for record in iter_pdf_chunks(source, workers):
+            results[(record["page"], record["chunk_index"])] = record["text"]
 
         logger.info(
-            f"Successfully extracted chunks from PDF: {pdf_path}, "
+            f"Successfully extracted chunks from PDF: {describe_source(source)}, "
             f"total chunks: {len(results)}"
         )
 
         return results
 
     except Exception as e:
-        logger.error(f"PDF extraction failed for {pdf_path}: {str(e)}")
+        logger.error(f"PDF extraction failed for {describe_source(source)}: {str(e)}")
         return {}
 
     finally:
-        logger.debug(f"Exiting extract_text_from_pdf for file: {pdf_path}")
+        logger.debug(f"Exiting extract_text_from_pdf for file: {describe_source(source)}")
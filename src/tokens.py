@@ -0,0 +1,25 @@
+import math
+
+# Mistral's tokenizer averages roughly four characters per token on English
+# report text; close enough for budgeting without loading a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    kept = []
+    used = 0
+    for word in words:
+        used += len(word) + 1
+        if used > max_tokens * CHARS_PER_TOKEN:
+            break
+        kept.append(word)
+    return " ".join(kept)
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.alt_questions import ask_first_confident
+
+CONFIDENT = SimpleNamespace(value=42.0, confidence=0.9)
+UNSURE = SimpleNamespace(value=None, confidence=0.0)
+
+
+def make_calls(outcomes, delays=None):
+    """One call per outcome; an Exception outcome is raised. Records which calls ran."""
+    started = []
+
+    def make(i, outcome):
+        async def call():
+            started.append(i)
+            await asyncio.sleep((delays or {}).get(i, 0))
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return call
+
+    return [make(i, outcome) for i, outcome in enumerate(outcomes)], started
+
+
+def ask(outcomes, strategy, delays=None, hedge_delay=0.05):
+    calls, started = make_calls(outcomes, delays)
+    return asyncio.run(ask_first_confident(calls, strategy, hedge_delay)), started
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_primary_confident(strategy):
+    (winner, response), _ = ask([CONFIDENT, UNSURE], strategy)
+    assert (winner, response) == (0, CONFIDENT)
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_falls_through_to_confident_alt(strategy):
+    (winner, response), _ = ask([UNSURE, UNSURE, CONFIDENT], strategy)
+    assert (winner, response) == (2, CONFIDENT)
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_nothing_confident_returns_primary(strategy):
+    (winner, response), _ = ask([UNSURE, SimpleNamespace(value=1.0, confidence=0.2)], strategy)
+    assert winner is None and response is UNSURE
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_failing_alt_moves_on(strategy):
+    (winner, response), started = ask([UNSURE, RuntimeError("boom"), CONFIDENT, CONFIDENT], strategy)
+    assert (winner, response) == (2, CONFIDENT)
+    assert 2 in started
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_failing_primary_is_tolerated(strategy):
+    (winner, response), _ = ask([RuntimeError("boom"), UNSURE, CONFIDENT], strategy)
+    assert (winner, response) == (2, CONFIDENT)
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_failing_primary_falls_back_to_unconfident_answer(strategy):
+    (winner, response), _ = ask([RuntimeError("boom"), UNSURE], strategy)
+    assert winner is None and response is UNSURE
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "parallel", "hedged"])
+def test_all_failing_raises_first_error(strategy):
+    with pytest.raises(RuntimeError, match="first"):
+        ask([RuntimeError("first"), RuntimeError("second")], strategy)
+
+
+def test_hedged_failure_launches_next_without_waiting():
+    # With a long hedge delay, only an immediate hand-over can reach the alt in time.
+    (winner, _), started = ask([RuntimeError("boom"), CONFIDENT], "hedged", hedge_delay=10)
+    assert winner == 1 and started == [0, 1]
+
+
+def test_hedged_launches_alt_when_primary_is_slow():
+    (winner, _), started = ask([CONFIDENT, CONFIDENT], "hedged", delays={0: 1.0}, hedge_delay=0.05)
+    assert winner == 1 and started == [0, 1]
+
+
+def test_sequential_stops_at_first_confident():
+    _, started = ask([UNSURE, CONFIDENT, CONFIDENT], "sequential")
+    assert started == [0, 1]
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        ask([CONFIDENT], "random")
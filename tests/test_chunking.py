@@ -0,0 +1,109 @@
+from src.chunking import TABLE_TOKEN_FACTOR, chunk_blocks
+from src.tokens import estimate_tokens
+
+MAX_TOKENS = 350
+OVERLAP_TOKENS = 70
+
+
+def paragraph(words: int, start: int = 0) -> str:
+    return " ".join(f"word{i}" for i in range(start, start + words))
+
+
+def blocks(*texts):
+    # One block per line, top to bottom, so each becomes its own layout unit.
+    return [(0, i * 20, 500, i * 20 + 10, text) for i, text in enumerate(texts)]
+
+
+def table(rows: int, cols: int = 3):
+    cells = []
+    for r in range(rows):
+        y = 1000 + r * 10
+        cells += [(c * 100, y, c * 100 + 90, y + 8, "Metric" if r == 0 and c == 0 else f"r{r}c{c}") for c in range(cols)]
+    return cells
+
+
+def chunk(*texts, extra=()):
+    return chunk_blocks(blocks(*texts) + list(extra), MAX_TOKENS, OVERLAP_TOKENS)
+
+
+def test_short_paragraphs_stay_within_limit():
+    # Many small units: the "\n" separators must count towards the limit.
+    notes = [f"Note {i} on energy use and emissions." for i in range(300)]
+    chunks = chunk(*notes)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(text) <= MAX_TOKENS for text, _ in chunks)
+    assert [word for text, carried in chunks for word in text.split()[carried:]] == " ".join(notes).split()
+
+
+def test_heading_runs_stay_within_limit():
+    headings = [f"Section {i} Energy Use" for i in range(300)]
+    chunks = chunk(*headings)
+    assert all(estimate_tokens(text) <= MAX_TOKENS for text, _ in chunks)
+    assert [heading for text, _ in chunks for heading in text.split("\n")] == headings
+
+
+def test_long_paragraph_is_cut_with_overlap():
+    words = paragraph(600).split()
+    chunks = chunk(" ".join(words))
+    assert len(chunks) > 1
+    assert all(estimate_tokens(text) <= MAX_TOKENS for text, _ in chunks)
+    for (previous, _), (current, carried) in zip(chunks, chunks[1:]):
+        assert carried > 0
+        assert previous.split()[-carried:] == current.split()[:carried]
+        assert estimate_tokens(" ".join(current.split()[:carried])) <= OVERLAP_TOKENS
+
+
+def test_overlap_words_reassemble_the_text():
+    words = paragraph(1500).split()
+    chunks = chunk(" ".join(words))
+    rebuilt = []
+    for text, carried in chunks:
+        rebuilt += text.split()[carried:]
+    assert rebuilt == words
+
+
+def test_paragraph_that_fits_is_not_cut():
+    first, second = paragraph(100), paragraph(100, start=100)
+    chunks = chunk(first, second)
+    assert [text.split()[carried:] for text, carried in chunks] == [first.split(), second.split()]
+
+
+def test_heading_opens_a_new_chunk():
+    chunks = chunk(paragraph(20), "Energy Consumption", paragraph(20, start=20))
+    assert len(chunks) == 2
+    assert chunks[1][0].startswith("Energy Consumption\n")
+    assert chunks[1][1] == 0
+
+
+def test_heading_with_oversized_paragraph_stays_within_limit():
+    chunks = chunk("Climate Change", paragraph(800))
+    assert chunks[0][0].startswith("Climate Change\n")
+    assert all(estimate_tokens(text) <= MAX_TOKENS for text, _ in chunks)
+
+
+def test_heading_closing_the_page_is_kept():
+    chunks = chunk(paragraph(20), "Water Use")
+    assert chunks[-1] == ("Water Use", 0)
+
+
+def test_table_is_kept_whole():
+    chunks = chunk(paragraph(20), extra=table(10))
+    tables = [text for text, _ in chunks if "|" in text]
+    assert len(tables) == 1 and tables[0].count("\n") >= 9
+    assert all(carried == 0 for text, carried in chunks if "|" in text)
+
+
+def test_large_table_is_split_between_rows_with_header():
+    chunks = chunk(extra=table(400))
+    pieces = [text for text, _ in chunks]
+    assert len(pieces) > 1
+    for piece in pieces:
+        assert piece.split("\n")[0].startswith("Metric | ")
+        assert estimate_tokens(piece) <= MAX_TOKENS * TABLE_TOKEN_FACTOR
+    rows = [row for piece in pieces for row in piece.split("\n")[1:]]
+    assert len(rows) == len(set(rows)) == 399
+
+
+def test_output_is_deterministic():
+    page = blocks("Targets", paragraph(700), "Metric note") + table(30)
+    assert chunk_blocks(page) == chunk_blocks(list(page))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+MIN_MEAN_COSINE = 0.99
+MIN_COSINE = 0.97
+
+SAMPLE = [
+    "Total Scope 1 greenhouse gas emissions were 12,450 tCO2e in the reporting year.",
+    "Scope 2 market-based emissions decreased by 8% compared with the previous year.",
+    "Total energy consumption amounted to 84,300 MWh, of which 41% came from renewable sources.",
+    "The company employed an average of 2,315 full-time equivalents during 2023.",
+    "Women represent 38% of the Board of Directors and 29% of senior management.",
+    "The gender pay gap, measured as the difference in average gross hourly earnings, was 11.2%.",
+    "Average payment period to suppliers was 42 days; 87% of invoices were paid within terms.",
+    "Net revenue for the financial year was EUR 1.27 billion.",
+    "Water withdrawal in areas of high water stress totalled 310 megalitres.",
+    "No confirmed incidents of corruption or bribery were recorded during the period.",
+    "Metric | 2023 | 2022\nScope 1 tCO2e | 12450 | 13120\nScope 2 tCO2e | 5310 | 5770",
+    "Climate Change",
+]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    try:
+        from src.embeddings import load_model
+        model = load_model("torch")
+    except Exception as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+    return model.encode(SAMPLE, convert_to_numpy=True)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "int8"])
+def test_backend_matches_torch(reference, backend):
+    from src.embeddings import load_model
+    try:
+        model = load_model(backend)
+    except Exception as e:
+        pytest.skip(f"{backend} backend unavailable: {e}")
+
+    embeddings = model.encode(SAMPLE, convert_to_numpy=True)
+    assert embeddings.shape == reference.shape
+
+    cosines = cosine_rows(reference, embeddings)
+    assert cosines.mean() >= MIN_MEAN_COSINE, f"mean cosine {cosines.mean():.4f}"
+    assert cosines.min() >= MIN_COSINE, f"min cosine {cosines.min():.4f}"